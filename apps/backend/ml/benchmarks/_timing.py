@@ -0,0 +1,75 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def use_ml_path() -> None:
+    """Make the ML service modules importable the same way main.py imports them."""
+    if ML_DIR not in sys.path:
+        sys.path.insert(0, ML_DIR)
+
+
+def measure(fn: Callable[[], Any], repeats: int = 30, warmup: int = 3, min_time: float = 0.2) -> Dict[str, float]:
+    """
+    Time fn() after a few warm-up calls. Runs at least `repeats` calls and
+    keeps going until min_time seconds have passed; reports milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeats or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+
+    samples.sort()
+    return {
+        "calls": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": percentile(samples, 0.95),
+        "min_ms": samples[0],
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ML_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def percentile(sorted_samples, fraction: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_report(report: Dict[str, Any], path: str = None) -> None:
+    """Print the JSON report, or write it to path when one is given."""
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
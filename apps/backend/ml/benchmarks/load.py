@@ -0,0 +1,126 @@
+"""
+HTTP load test of the FastAPI app, served in-process over ASGI (no sockets),
+reporting p50/p95/p99 latency and requests/s at several concurrency levels.
+
+    python benchmarks/load.py --concurrency 1 8 32 128 --requests 2000 --out load.json
+"""
+import argparse
+import asyncio
+import collections
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from _timing import ML_DIR, environment, percentile, use_ml_path, write_report
+
+use_ml_path()
+
+DEFAULT_CONCURRENCY = [1, 8, 32, 128]
+
+
+def make_bodies(rng) -> Dict[str, Callable[[], Dict[str, Any]]]:
+    """Request body factories per endpoint; rows are random so the result cache sees misses."""
+    def features(n=None):
+        shape = (n, 7) if n else 7
+        return np.round(rng.uniform(0.2, 1.0, size=shape), 4).tolist()
+
+    return {
+        "/predict": lambda: {"features": features()},
+        "/predict-match": lambda: {
+            "homeTeam": "Home",
+            "awayTeam": "Away",
+            "homeTeamStats": dict(zip(("strength", "form", "injuries"), features()[:3])),
+            "awayTeamStats": dict(zip(("strength", "form"), features()[:2])),
+        },
+        "/predict-batch": lambda: {"rows": features(64)},
+    }
+
+
+async def run_level(client, endpoint: str, make_body, concurrency: int, total: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses = collections.Counter()
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            body = make_body()
+            started = time.perf_counter()
+            response = await client.post(endpoint, json=body)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": latencies[-1],
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def run_async(endpoints: List[str], concurrency_levels: List[int], total: int) -> List[Dict[str, Any]]:
+    import httpx
+    import main
+
+    bodies = make_bodies(np.random.default_rng(0))
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+        await client.get("/health")
+        for endpoint in endpoints:
+            for concurrency in concurrency_levels:
+                result = await run_level(client, endpoint, bodies[endpoint], concurrency, total)
+                results.append(result)
+                print(f"{endpoint:>15} c={concurrency:<4} {result['requests_per_sec']:,.0f} req/s "
+                      f"p50={result['p50_ms']:.2f} p95={result['p95_ms']:.2f} p99={result['p99_ms']:.2f}ms "
+                      f"{result['status_codes']}", file=sys.stderr)
+    main.executor.shutdown()
+    return results
+
+
+def run(model_path: str, endpoints: List[str] = None, concurrency_levels: List[int] = None,
+        total: int = 1000, cache: bool = False) -> List[Dict[str, Any]]:
+    # main.py reads its configuration at import time
+    os.environ["ML_MODEL_PATH"] = model_path
+    os.environ["ML_MODEL_WATCH_INTERVAL"] = "0"
+    os.environ.setdefault("ML_CACHE_SIZE", "10000" if cache else "0")
+    return asyncio.run(run_async(
+        endpoints or ["/predict", "/predict-match", "/predict-batch"],
+        concurrency_levels or DEFAULT_CONCURRENCY,
+        total,
+    ))
+
+
+def main():
+    from micro import ensure_model
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=os.path.join(ML_DIR, "model_data.pkl"))
+    parser.add_argument("--endpoints", nargs="+", default=["/predict", "/predict-match", "/predict-batch"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint and concurrency level")
+    parser.add_argument("--cache", action="store_true", help="leave the prediction cache enabled")
+    parser.add_argument("--work-dir", help="train a missing model here and keep it, instead of a temporary directory")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = run(ensure_model(args.model_path, args.work_dir), args.endpoints, args.concurrency, args.requests, args.cache)
+    write_report({"benchmark": "http_load", "environment": environment(), "results": results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Microbenchmarks for MagajiCoMLPredictor: single vs batched prediction on the
+model and rule-based paths, model load time, and resident memory per worker.
+
+    python benchmarks/micro.py --out micro.json
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+import numpy as np
+
+from _timing import ML_DIR, environment, measure, use_ml_path, write_report
+
+use_ml_path()
+
+from predictionModel import MagajiCoMLPredictor, artifact_path_for  # noqa: E402
+
+DEFAULT_BATCH_SIZES = [1, 8, 64, 512, 4096]
+
+# Runs in a fresh interpreter so each format is measured as a cold worker would see it
+LOAD_PROBE = """
+import json, sys, time
+sys.path.insert(0, {ml_dir!r})
+
+def memory_kb():
+    fields = {{}}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0])
+    return fields
+
+import numpy as np
+import predictionModel
+if {force_pickle!r}:
+    predictionModel.artifact_path_for = lambda path: path + ".missing"
+
+before = memory_kb()
+started = time.perf_counter()
+predictor = predictionModel.MagajiCoMLPredictor(model_path={model_path!r})
+load_ms = (time.perf_counter() - started) * 1000.0
+loaded = memory_kb()
+predictor.predict_many(np.random.default_rng(0).uniform(0.2, 1.0, size=(4096, 7)))
+warm = memory_kb()
+print(json.dumps({{
+    "load_ms": load_ms,
+    "using_model": predictor.get_model_info()["using_model"],
+    "sklearn_imported": "sklearn" in sys.modules,
+    "rss_kb": {{"before": before, "loaded": loaded, "warm": warm}},
+}}))
+"""
+
+
+def ensure_model(model_path: str, work_dir: str = None) -> str:
+    """
+    Path of a model to benchmark: model_path when it has an exported
+    artifact, otherwise a freshly trained one so the service's own model
+    files are never touched. It is trained into work_dir when given (and
+    kept for later runs), else into a temporary directory removed at exit.
+    """
+    if os.path.isdir(artifact_path_for(model_path)):
+        return model_path
+    from train_model import train_model
+
+    if work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+        model_path = os.path.join(work_dir, "model_data.pkl")
+        if os.path.isdir(artifact_path_for(model_path)):
+            return model_path
+    else:
+        work_dir = tempfile.mkdtemp(prefix="ml-bench-")
+        atexit.register(shutil.rmtree, work_dir, ignore_errors=True)
+        model_path = os.path.join(work_dir, "model_data.pkl")
+    print(f"No model artifact found, training one at {model_path}", file=sys.stderr)
+    train_model(model_path=model_path)
+    return model_path
+
+
+def bench_predict(model_path: str, batch_sizes: List[int]) -> List[Dict[str, Any]]:
+    predictors = {
+        "model": MagajiCoMLPredictor(model_path=model_path),
+        "rules": MagajiCoMLPredictor(model_path=None),
+    }
+    rng = np.random.default_rng(0)
+    results = []
+
+    for path, predictor in predictors.items():
+        row = rng.uniform(0.2, 1.0, size=7).tolist()
+        stats = measure(lambda: predictor.predict(row))
+        results.append({"path": path, "mode": "single", "batch_size": 1, **stats})
+
+        for batch_size in batch_sizes:
+            X = rng.uniform(0.2, 1.0, size=(batch_size, 7))
+            stats = measure(lambda: predictor.predict_many(X))
+            stats["rows_per_sec"] = batch_size / (stats["p50_ms"] / 1000.0)
+            results.append({"path": path, "mode": "batched", "batch_size": batch_size, **stats})
+            print(f"{path:>6} batched batch={batch_size:<6} p50={stats['p50_ms']:.3f}ms "
+                  f"{stats['rows_per_sec']:,.0f} rows/s", file=sys.stderr)
+
+    return results
+
+
+def bench_load(model_path: str, repeats: int = 3) -> List[Dict[str, Any]]:
+    results = []
+    for fmt, force_pickle in (("artifact", False), ("pickle", True)):
+        probe = LOAD_PROBE.format(ml_dir=ML_DIR, model_path=model_path, force_pickle=force_pickle)
+        runs = []
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+            runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+        best = min(runs, key=lambda run: run["load_ms"])
+        rss = best["rss_kb"]
+        results.append({
+            "format": fmt,
+            "load_ms": best["load_ms"],
+            "using_model": best["using_model"],
+            "sklearn_imported": best["sklearn_imported"],
+            "rss_delta_kb": rss["warm"]["VmRSS"] - rss["before"]["VmRSS"],
+            # Anonymous memory is private to the worker; file-backed pages are shared
+            "private_delta_kb": rss["warm"].get("RssAnon", 0) - rss["before"].get("RssAnon", 0),
+            "shared_delta_kb": rss["warm"].get("RssFile", 0) - rss["before"].get("RssFile", 0),
+        })
+        print(f"{fmt:>8} load={best['load_ms']:.1f}ms private+={results[-1]['private_delta_kb']}kB",
+              file=sys.stderr)
+    return results
+
+
+def run(model_path: str, batch_sizes: List[int] = None, work_dir: str = None) -> Dict[str, Any]:
+    model_path = ensure_model(model_path, work_dir)
+    return {
+        "predict": bench_predict(model_path, batch_sizes or DEFAULT_BATCH_SIZES),
+        "load": bench_load(model_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=os.path.join(ML_DIR, "model_data.pkl"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--work-dir", help="train a missing model here and keep it, instead of a temporary directory")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = run(args.model_path, args.batch_sizes, args.work_dir)
+    write_report({"benchmark": "micro", "environment": environment(), **report}, args.out)
+
+
+if __name__ == "__main__":
+    main()
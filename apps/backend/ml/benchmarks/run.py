@@ -0,0 +1,70 @@
+"""
+Run the full prediction service benchmark suite and write one JSON report.
+
+    python benchmarks/run.py --out bench-$(git rev-parse --short HEAD).json
+    python benchmarks/run.py --quick
+    python benchmarks/run.py --compare bench-old.json bench-new.json
+"""
+import argparse
+import json
+import os
+import sys
+
+from _timing import ML_DIR, environment, write_report
+
+import load
+import micro
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Print p50 changes for every result present in both reports."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def index(report):
+        rows = {}
+        for row in report.get("micro", {}).get("predict", []):
+            rows[("predict", row["path"], row["mode"], row["batch_size"])] = row["p50_ms"]
+        for row in report.get("micro", {}).get("load", []):
+            rows[("load", row["format"])] = row["load_ms"]
+        for row in report.get("http", []):
+            rows[("http", row["endpoint"], row["concurrency"])] = row["p50_ms"]
+        return rows
+
+    before, after = index(old), index(new)
+    print(f"{old['environment'].get('commit')} -> {new['environment'].get('commit')}")
+    for key in sorted(before.keys() & after.keys(), key=str):
+        change = (after[key] - before[key]) / before[key] * 100.0 if before[key] else 0.0
+        print(f"{' '.join(map(str, key)):<45} {before[key]:>10.3f}ms {after[key]:>10.3f}ms {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=os.path.join(ML_DIR, "model_data.pkl"))
+    parser.add_argument("--quick", action="store_true", help="small batch sizes and request counts")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--work-dir", help="train a missing model here and keep it, instead of a temporary directory")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved reports")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    model_path = micro.ensure_model(args.model_path, args.work_dir)
+    batch_sizes = [1, 64, 1024] if args.quick else micro.DEFAULT_BATCH_SIZES
+    report = {"benchmark": "suite", "environment": environment(), "micro": micro.run(model_path, batch_sizes)}
+
+    if not args.skip_http:
+        concurrency = [1, 16, 64] if args.quick else load.DEFAULT_CONCURRENCY
+        report["http"] = load.run(model_path, concurrency_levels=concurrency, total=200 if args.quick else 1000)
+
+    write_report(report, args.out)
+    print("Benchmark suite finished", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
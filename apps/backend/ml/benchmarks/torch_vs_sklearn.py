@@ -0,0 +1,96 @@
+"""
+Latency and throughput per batch size: PyTorch MatchPredictor variants
+against the RandomForest serving paths.
+
+    python benchmarks/torch_vs_sklearn.py --batch-sizes 1 8 64 512 4096 --out torch.json
+"""
+import argparse
+import importlib.util
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from _timing import ML_DIR, environment, measure, use_ml_path, write_report
+
+use_ml_path()
+
+from predictionModel import compile_forest  # noqa: E402
+from train_model import generate_training_data  # noqa: E402
+
+
+def load_forest(model_path: str):
+    """The pickled sklearn model and scaler, or a freshly fitted pair if none is on disk."""
+    try:
+        with open(model_path, "rb") as f:
+            saved = pickle.load(f)
+        return saved["model"], saved["scaler"]
+    except Exception:
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        X, y = generate_training_data(10000)
+        scaler = StandardScaler().fit(X)
+        model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42, n_jobs=-1)
+        return model.fit(scaler.transform(X), y), scaler
+
+
+def load_torch_servers(torch_path: str, threads: int, variants):
+    # src/models/predictionModel.py shares its module name with the ML service one
+    spec = importlib.util.spec_from_file_location(
+        "torch_prediction_model", os.path.join(os.path.dirname(ML_DIR), "src", "models", "predictionModel.py")
+    )
+    torch_model = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(torch_model)
+
+    if os.path.exists(torch_path):
+        module = torch_model.load_model(7, torch_path)
+    else:
+        module = torch_model.MatchPredictor(7).eval()
+
+    torch_model.configure_threads(threads, 1)
+    return {variant: torch_model.MatchPredictorServer(module, variant=variant) for variant in variants}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64, 512, 4096])
+    parser.add_argument("--model-path", default=os.path.join(ML_DIR, "model_data.pkl"))
+    parser.add_argument("--torch-path", default="prediction_model.pth")
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    parser.add_argument("--variants", nargs="+", default=["eager", "torchscript", "quantized"])
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    model, scaler = load_forest(args.model_path)
+    forest = compile_forest(model, scaler)
+
+    candidates = {
+        "sklearn": lambda X: model.predict_proba(scaler.transform(X)),
+        "flat_forest": forest.predict_proba,
+    }
+    for variant, server in load_torch_servers(args.torch_path, args.threads, args.variants).items():
+        candidates[f"torch_{variant}"] = server.predict_proba
+
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in args.batch_sizes:
+        X = rng.uniform(0.2, 1.0, size=(batch_size, 7))
+        for name, predict in candidates.items():
+            stats = measure(lambda: predict(X))
+            stats.update({
+                "backend": name,
+                "batch_size": batch_size,
+                "rows_per_sec": batch_size / (stats["p50_ms"] / 1000.0),
+            })
+            results.append(stats)
+            print(f"{name:>18} batch={batch_size:<6} p50={stats['p50_ms']:.3f}ms "
+                  f"{stats['rows_per_sec']:,.0f} rows/s", file=sys.stderr)
+
+    write_report({"benchmark": "torch_vs_sklearn", "environment": environment(),
+                  "torch_threads": args.threads, "results": results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
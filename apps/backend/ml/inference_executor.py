@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from metrics import SamplingProfiler
+from predictionModel import MagajiCoMLPredictor
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceSaturated(Exception):
+    """Raised when the pending-work limit is reached; callers should shed load (503)."""
+
+
+class InferenceTimeout(Exception):
+    """Raised when a prediction does not finish within the per-request timeout (504)."""
+
+
+# Per-process predictor used by the process pool workers
+_worker_predictor: Optional[MagajiCoMLPredictor] = None
+
+
+def _init_process_worker(model_path: Optional[str]) -> None:
+    global _worker_predictor
+    _worker_predictor = MagajiCoMLPredictor(model_path=model_path)
+
+
+def _process_predict_many(rows) -> List[Dict[str, Any]]:
+    return _worker_predictor.predict_many(rows)
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound inference off the asyncio event loop.
+
+    mode="thread" shares the caller's predictor across a bounded thread pool
+    (NumPy and sklearn release the GIL for most of the work); mode="process"
+    gives each worker process its own predictor loaded from model_path.
+    Thread-mode calls go through the sampling profiler, if one is enabled.
+    At most max_pending batches may be queued or running at once, and every
+    call is bounded by timeout seconds.
+    """
+
+    MODES = ("thread", "process")
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: Optional[int] = None,
+        max_pending: int = 64,
+        timeout: Optional[float] = 5.0,
+        model_path: Optional[str] = None,
+        profiler: Optional[SamplingProfiler] = None,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown executor mode '{mode}', expected one of {self.MODES}")
+
+        self.mode = mode
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.model_path = model_path
+        self.profiler = profiler or SamplingProfiler()
+
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool: Executor = self._create_pool()
+
+    @classmethod
+    def from_env(cls, model_path: Optional[str] = None, profiler: Optional[SamplingProfiler] = None) -> "InferenceExecutor":
+        timeout = float(os.getenv("ML_PREDICT_TIMEOUT", "5"))
+        return cls(
+            mode=os.getenv("ML_EXECUTOR", "thread"),
+            max_workers=int(os.getenv("ML_EXECUTOR_WORKERS", "0")) or None,
+            max_pending=int(os.getenv("ML_MAX_PENDING", "64")),
+            timeout=timeout if timeout > 0 else None,
+            model_path=model_path,
+            profiler=profiler,
+        )
+
+    def _create_pool(self) -> Executor:
+        if self.mode == "process":
+            return ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_process_worker,
+                initargs=(self.model_path,),
+            )
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def predict_many(self, predictor: MagajiCoMLPredictor, rows) -> List[Dict[str, Any]]:
+        """Score rows on the pool; raises InferenceSaturated or InferenceTimeout under pressure."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise InferenceSaturated(f"Inference queue full ({self.max_pending} pending)")
+            self._pending += 1
+
+        try:
+            if self.mode == "process":
+                future = self._pool.submit(_process_predict_many, rows)
+            else:
+                future = self._pool.submit(self.profiler.call, predictor.predict_many, rows)
+        except BaseException:
+            self._release(None)
+            raise
+
+        # The slot is only freed once the work really finishes, so timed-out
+        # calls still count against max_pending while they drain.
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise InferenceTimeout(f"Prediction exceeded {self.timeout}s")
+
+    async def refresh(self, _predictor=None) -> None:
+        """
+        Pick up a newly deployed model. Thread workers share the caller's
+        predictor so need nothing; process workers hold their own copy, so a
+        fresh pool is started and warmed while the old one keeps serving, and
+        the old pool is retired once its queued work drains.
+        """
+        if self.mode != "process":
+            return
+
+        pool = self._create_pool()
+        warmups = [
+            asyncio.wrap_future(pool.submit(_process_predict_many, [[0.5] * 7]))
+            for _ in range(self.max_workers)
+        ]
+        await asyncio.gather(*warmups)
+
+        self._pool, previous = pool, self._pool
+        previous.shutdown(wait=False)
+        logger.info("Inference process pool refreshed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "timeout": self.timeout,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("Inference executor shut down")
@@ -1,19 +1,93 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import asyncio
+import hmac
+import json
 import logging
-from predictionModel import MagajiCoMLPredictor
+import math
+import os
+import metrics
+from model_registry import ModelRegistry
+from predictionModel import FEATURE_NAMES, set_stage_observer
+from inference_executor import InferenceExecutor, InferenceSaturated, InferenceTimeout
+from micro_batcher import MicroBatcher
+from prediction_cache import PredictionCache
+from shared_cache import SharedPredictionCache
+from team_store import TeamFeatureStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MODEL_PATH = os.getenv("ML_MODEL_PATH", "model_data.pkl")
+
+MODEL_LOAD_SECONDS = metrics.registry.histogram(
+    "ml_model_load_seconds", "Time to load and warm each model revision", (0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10)
+)
+MODEL_REVISION = metrics.registry.gauge("ml_model_revision", "Revision of the active model", aggregate="max")
+CACHE_LOOKUPS = metrics.registry.counter("ml_cache_lookups_total", "Prediction cache lookups", ("result",))
+# Every worker reports the same entries of a shared cache, so take one of them
+CACHE_ENTRIES = metrics.registry.gauge("ml_cache_entries", "Prediction cache entries",
+                                       aggregate="max" if os.getenv("ML_SHARED_CACHE_NAME") else "sum")
+INFERENCE_PENDING = metrics.registry.gauge("ml_inference_pending", "Batches queued or running on the executor")
+
+registry = ModelRegistry(
+    model_path=MODEL_PATH,
+    watch_interval=float(os.getenv("ML_MODEL_WATCH_INTERVAL", "5"))
+)
+MODEL_LOAD_SECONDS.observe(registry.load_seconds)
+set_stage_observer(metrics.observe_stage)
+profiler = metrics.SamplingProfiler.from_env()
+executor = InferenceExecutor.from_env(model_path=MODEL_PATH, profiler=profiler)
+# serve.py publishes a shared cache segment when running several workers
+cache = SharedPredictionCache.from_env() if os.getenv("ML_SHARED_CACHE_NAME") else PredictionCache.from_env()
+registry.add_listener(executor.refresh)
+registry.add_listener(cache.clear)
+registry.add_listener(lambda _predictor: MODEL_LOAD_SECONDS.observe(registry.load_seconds))
+team_store = TeamFeatureStore.from_env()
+# serve.py points every worker at one metrics directory when running several
+metrics_collector = metrics.MultiProcessCollector.from_env(metrics.registry)
+
+MAX_BATCH_SIZE = int(os.getenv("ML_MAX_BATCH_SIZE", "10000"))
+ADMIN_TOKEN = os.getenv("ML_ADMIN_TOKEN")
+STREAM_BATCH_SIZE = int(os.getenv("ML_STREAM_BATCH_SIZE", "256"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("ML_STREAM_MAX_LINE_BYTES", "65536"))
+
+def require_admin(x_admin_token: Optional[str]) -> None:
+    """Admin routes are closed unless ML_ADMIN_TOKEN is set and presented in X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ML_ADMIN_TOKEN to enable them")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    watchers = []
+    if registry.watch_interval > 0:
+        watchers.append(asyncio.create_task(registry.watch()))
+    if team_store.enabled and team_store.watch_interval > 0:
+        watchers.append(asyncio.create_task(team_store.watch()))
+    if metrics_collector is not None:
+        watchers.append(asyncio.create_task(metrics_collector.run()))
+    yield
+    for watcher in watchers:
+        watcher.cancel()
+    if metrics_collector is not None:
+        # Leave this worker's final totals for the workers still serving
+        metrics_collector.write()
+    executor.shutdown()
+
 app = FastAPI(
     title="MagajiCo ML Prediction API",
     description="Machine Learning API for sports predictions",
-    version="2.1.0"
+    version="2.1.0",
+    lifespan=lifespan
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -22,8 +96,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-predictor = MagajiCoMLPredictor(model_path="model_data.pkl")
-
 class PredictionRequest(BaseModel):
     features: List[float] = Field(
         ...,
@@ -32,9 +104,18 @@ class PredictionRequest(BaseModel):
         max_items=7
     )
 
+class BatchPredictionRequest(BaseModel):
+    rows: List[List[float]] = Field(
+        ...,
+        description="Feature rows, each with the same 7 features as /predict",
+        min_items=1
+    )
+
 class MatchPredictionRequest(BaseModel):
     homeTeam: str
     awayTeam: str
+    homeTeamId: Optional[str] = None
+    awayTeamId: Optional[str] = None
     homeTeamStats: Dict[str, Any] = {}
     awayTeamStats: Dict[str, Any] = {}
 
@@ -44,6 +125,61 @@ class PredictionResponse(BaseModel):
     probabilities: Dict[str, float]
     model_version: str
 
+class BatchPredictionResponse(BaseModel):
+    predictions: List[PredictionResponse]
+    count: int
+    model_version: str
+
+async def score_batch(rows) -> List[Dict[str, Any]]:
+    return await executor.predict_many(registry.active, rows)
+
+batcher = MicroBatcher.from_env(score_batch)
+metrics.registry.register(batcher.batch_sizes)
+metrics.registry.register(batcher.queue_delay)
+
+async def run_inference(rows) -> List[Dict[str, Any]]:
+    """Run predictor.predict_many off the event loop, mapping pressure to HTTP errors"""
+    try:
+        return await score_batch(rows)
+    except InferenceSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except InferenceTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+async def run_single(features: List[float]) -> Dict[str, Any]:
+    """
+    Score one row, answering repeats from the cache and sending misses
+    through the micro-batcher so concurrent callers share a batch
+    """
+    try:
+        features = [float(value) for value in features]
+    except (TypeError, ValueError):
+        raise ValueError("Features must be numeric")
+    for name, value in zip(FEATURE_NAMES, features):
+        if not math.isfinite(value):
+            raise ValueError(f"{name} must be a finite number, got {value!r}")
+
+    try:
+        key = cache.key(registry.model_key, features) if cache.enabled else None
+    except OverflowError:
+        # Too large to quantize into a key; such rows are scored uncached
+        key = None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        result = await batcher.submit(features)
+    except InferenceSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except InferenceTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    if key is not None:
+        cache.put(key, result)
+    return result
+
 @app.get("/")
 async def root():
     return {
@@ -53,7 +189,11 @@ async def root():
         "endpoints": {
             "health": "/health",
             "predict": "/predict",
-            "model_info": "/model-info"
+            "predict_batch": "/predict-batch",
+            "predict_match_stream": "/predict-match/stream",
+            "model_info": "/model-info",
+            "batching_stats": "/batching-stats",
+            "metrics": "/metrics"
         }
     }
 
@@ -62,56 +202,274 @@ async def health():
     return {
         "status": "healthy",
         "service": "ml-prediction",
-        "model": predictor.get_model_info()
+        "model": registry.info(),
+        "executor": executor.stats(),
+        "batching": batcher.stats(),
+        "cache": cache.stats(),
+        "team_features": team_store.stats()
     }
 
 @app.get("/model-info")
 async def model_info():
-    return predictor.get_model_info()
+    return registry.info()
+
+@app.post("/admin/reload-model")
+async def reload_model(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Load the model files on disk and swap them in without dropping requests"""
+    require_admin(x_admin_token)
+    reloaded = await registry.reload(force=force)
+    return {"reloaded": reloaded, "model": registry.info()}
+
+@app.post("/admin/reload-team-features")
+async def reload_team_features(force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Fold changes to the team feature files into the store now instead of at the next poll"""
+    require_admin(x_admin_token)
+    if not team_store.enabled:
+        raise HTTPException(status_code=404, detail="Team feature store is not configured")
+    changes = await team_store.refresh(force=force)
+    return {"changes": changes, "team_features": team_store.stats()}
+
+def collect_service_metrics() -> None:
+    MODEL_REVISION.set(registry.revision)
+    CACHE_LOOKUPS.set_total(cache.hits, "hit")
+    CACHE_LOOKUPS.set_total(cache.misses, "miss")
+    CACHE_ENTRIES.set(cache.stats()["entries"])
+    INFERENCE_PENDING.set(executor.stats()["pending"])
+
+metrics.registry.on_collect(collect_service_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, stage, batching, cache and model metrics"""
+    text = metrics_collector.render() if metrics_collector is not None else metrics.registry.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(limit: int = 30, sort: str = "cumulative", reset: bool = False,
+                        x_admin_token: Optional[str] = Header(None)):
+    """Aggregated cProfile output of sampled inference calls (ML_PROFILE_SAMPLE_RATE > 0)"""
+    require_admin(x_admin_token)
+    return profiler.report(limit=limit, sort=sort, reset=reset)
+
+@app.get("/batching-stats")
+async def batching_stats():
+    return batcher.stats()
 
 @app.post("/predict", response_model=PredictionResponse)
 async def predict(request: PredictionRequest):
     try:
-        result = predictor.predict(request.features)
-        return result
+        return await run_single(request.features)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail="Prediction failed")
 
+@app.post("/predict-batch", response_model=BatchPredictionResponse)
+async def predict_batch(request: BatchPredictionRequest):
+    """Score many feature rows in one pass; results keep the input order"""
+    if len(request.rows) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.rows)} rows (max {MAX_BATCH_SIZE})"
+        )
+    try:
+        results = await run_inference(request.rows)
+        return {
+            "predictions": results,
+            "count": len(results),
+            "model_version": results[0]["model_version"]
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Batch prediction failed")
+
+# Used for any feature neither the team store nor the caller supplies
+DEFAULT_MATCH_FEATURES = {
+    "home_strength": 0.7, "away_strength": 0.6, "home_advantage": 0.65,
+    "recent_form_home": 0.6, "recent_form_away": 0.5, "head_to_head": 0.5, "injuries": 0.8
+}
+
+# (stats dict, stats key) each caller-supplied value maps to
+CALLER_STAT_FEATURES = {
+    "home_strength": ("homeTeamStats", "strength"),
+    "away_strength": ("awayTeamStats", "strength"),
+    "recent_form_home": ("homeTeamStats", "form"),
+    "recent_form_away": ("awayTeamStats", "form"),
+    "injuries": ("homeTeamStats", "injuries"),
+}
+
+def match_features(request: MatchPredictionRequest) -> List[float]:
+    """
+    Feature row for a match. Values come from the team feature store when
+    team ids are given, are overridden by any stats the caller sends, and
+    fall back to DEFAULT_MATCH_FEATURES. Raises ValueError for a stat that
+    is not a finite number
+    """
+    features = dict(DEFAULT_MATCH_FEATURES)
+    if team_store.enabled:
+        features.update(team_store.match_features(request.homeTeamId, request.awayTeamId))
+    for name, (stats_field, key) in CALLER_STAT_FEATURES.items():
+        stats = getattr(request, stats_field)
+        if key in stats:
+            try:
+                value = float(stats[key])
+            except (TypeError, ValueError):
+                value = math.nan
+            if not math.isfinite(value):
+                raise ValueError(f"{stats_field}.{key} must be a finite number, got {stats[key]!r}")
+            features[name] = value
+    return [features[name] for name in FEATURE_NAMES]
+
+def match_response(request: MatchPredictionRequest, result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "homeTeam": request.homeTeam,
+        "awayTeam": request.awayTeam,
+        "predictedWinner": result["prediction"],
+        "confidence": result["confidence"],
+        "probabilities": result["probabilities"],
+        "modelVersion": result["model_version"]
+    }
+
 @app.post("/predict-match")
 async def predict_match(request: MatchPredictionRequest):
     """Predict match outcome from team data"""
     try:
-        # Extract features from team stats or use defaults
-        home_strength = request.homeTeamStats.get("strength", 0.7)
-        away_strength = request.awayTeamStats.get("strength", 0.6)
-        home_advantage = 0.65
-        recent_form_home = request.homeTeamStats.get("form", 0.6)
-        recent_form_away = request.awayTeamStats.get("form", 0.5)
-        head_to_head = 0.5
-        injuries = request.homeTeamStats.get("injuries", 0.8)
+        with metrics.timed_stage("features"):
+            features = match_features(request)
         
-        features = [
-            home_strength, away_strength, home_advantage,
-            recent_form_home, recent_form_away, head_to_head, injuries
-        ]
+        result = await run_single(features)
         
-        result = predictor.predict(features)
-        
-        return {
-            "homeTeam": request.homeTeam,
-            "awayTeam": request.awayTeam,
-            "predictedWinner": result["prediction"],
-            "confidence": result["confidence"],
-            "probabilities": result["probabilities"],
-            "modelVersion": result["model_version"]
-        }
+        return match_response(request, result)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Match prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail="Match prediction failed")
 
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator consumes the request body as it
+    goes. Starlette's disconnect listener would otherwise race it for
+    receive() and swallow body chunks; a disconnect surfaces instead as
+    ClientDisconnect from request.stream().
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def ndjson_line(payload: Dict[str, Any]) -> bytes:
+    return (json.dumps(payload, separators=(",", ":")) + "\n").encode()
+
+def parse_match_line(line: bytes) -> Tuple[Optional[MatchPredictionRequest], Optional[List[float]], Optional[str]]:
+    """Parse one NDJSON record into (request, features, error)"""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return None, None, f"Invalid JSON: {str(e)}"
+    if not isinstance(record, dict):
+        return None, None, "Expected a JSON object"
+
+    try:
+        request = MatchPredictionRequest(**record)
+        return request, match_features(request), None
+    except ValidationError as e:
+        return None, None, f"Invalid record: {e.errors()}"
+    except ValueError as e:
+        return None, None, f"Invalid record: {str(e)}"
+
+async def score_match_lines(pending: List[Tuple[int, Optional[MatchPredictionRequest], Optional[List[float]], Optional[str]]]) -> bytes:
+    """Score the parsed records of one internal batch and render their NDJSON lines in input order"""
+    rows = [features for _, request, features, _ in pending if request is not None]
+    results: List[Dict[str, Any]] = []
+    batch_error = None
+    if rows:
+        try:
+            results = await run_inference(rows)
+        except HTTPException as e:
+            batch_error = e.detail
+        except ValueError as e:
+            batch_error = str(e)
+        except Exception as e:
+            logger.error(f"Streaming prediction error: {str(e)}")
+            batch_error = "Match prediction failed"
+
+    output = []
+    scored = iter(results)
+    for line_number, request, _, error in pending:
+        if request is None:
+            output.append(ndjson_line({"line": line_number, "error": error}))
+        elif batch_error is not None:
+            output.append(ndjson_line({"line": line_number, "error": batch_error}))
+        else:
+            output.append(ndjson_line({"line": line_number, **match_response(request, next(scored))}))
+    return b"".join(output)
+
+async def stream_match_predictions(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Read NDJSON records as they arrive and yield results in batches of at
+    most STREAM_BATCH_SIZE. A batch is also scored whenever the buffered
+    input runs out, so a slow producer still sees results promptly. Only
+    the current partial line and one batch are ever held in memory.
+    """
+    buffer = b""
+    line_number = 0
+    skipping = False
+    pending = []
+    too_long = f"Line exceeds {STREAM_MAX_LINE_BYTES} bytes"
+
+    async for chunk in body:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            if skipping:
+                # Tail of an over-long line that was already reported
+                skipping = False
+                continue
+            line_number += 1
+            if len(line) > STREAM_MAX_LINE_BYTES:
+                pending.append((line_number, None, None, too_long))
+            elif line.strip():
+                pending.append((line_number, *parse_match_line(line)))
+            if len(pending) >= STREAM_BATCH_SIZE:
+                yield await score_match_lines(pending)
+                pending = []
+
+        if len(buffer) > STREAM_MAX_LINE_BYTES:
+            if not skipping:
+                line_number += 1
+                pending.append((line_number, None, None, too_long))
+                skipping = True
+            buffer = b""
+
+        if pending:
+            yield await score_match_lines(pending)
+            pending = []
+
+    if buffer.strip() and not skipping:
+        pending.append((line_number + 1, *parse_match_line(buffer)))
+    if pending:
+        yield await score_match_lines(pending)
+
+@app.post("/predict-match/stream")
+async def predict_match_stream(request: Request):
+    """
+    Score a newline-delimited JSON body of /predict-match records, streaming
+    one NDJSON result per input line back as batches complete. Each result
+    carries its 1-based input line number; records that fail to parse or
+    score get an {"line", "error"} entry instead of failing the stream.
+    """
+    return RequestStreamingResponse(stream_match_predictions(request.stream()), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,443 @@
+import asyncio
+import bisect
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def _items(self) -> Dict[Tuple[str, ...], Any]:
+        raise NotImplementedError
+
+    def dump(self) -> List[List[Any]]:
+        """This process's series as JSON-friendly [labels, value] pairs"""
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._items().items()]
+
+    def merge(self, dumps: List[Tuple[List[List[Any]], bool]]) -> Dict[Tuple[str, ...], Any]:
+        """Combine dump()s of several processes, each paired with whether that process is alive"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set_total(self, value: float, *labels: str) -> None:
+        """Mirror a monotonically increasing total kept elsewhere (e.g. cache hit counts)."""
+        with self._lock:
+            self._values[labels] = value
+
+    def _items(self) -> Dict[Tuple[str, ...], float]:
+        return dict(self._values)
+
+    def merge(self, dumps: List[Tuple[List[List[Any]], bool]]) -> Dict[Tuple[str, ...], float]:
+        # Totals of exited workers stay in, so the sum never goes backwards
+        merged: Dict[Tuple[str, ...], float] = {}
+        for series, _alive in dumps:
+            for labels, value in series:
+                merged[tuple(labels)] = merged.get(tuple(labels), 0.0) + value
+        return merged
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        values = self._items() if values is None else values
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    """
+    Across processes a gauge combines the values of live workers only, by
+    "sum" (e.g. requests in flight) or "max" (e.g. entries of a cache they
+    all share).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), aggregate: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        if aggregate not in ("sum", "max"):
+            raise ValueError(f"Unknown gauge aggregate {aggregate!r}")
+        self.aggregate = aggregate
+
+    def merge(self, dumps: List[Tuple[List[List[Any]], bool]]) -> Dict[Tuple[str, ...], float]:
+        merged: Dict[Tuple[str, ...], float] = {}
+        for series, alive in dumps:
+            if not alive:
+                continue
+            for labels, value in series:
+                key = tuple(labels)
+                if key not in merged:
+                    merged[key] = value
+                elif self.aggregate == "sum":
+                    merged[key] += value
+                else:
+                    merged[key] = max(merged[key], value)
+        return merged
+
+    def set(self, value: float, *labels: str) -> None:
+        self.set_total(value, *labels)
+
+    def dec(self, amount: float = 1.0, *labels: str) -> None:
+        self.inc(-amount, *labels)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; per-bucket counts are stored flat and made cumulative on render."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [bucket counts..., +Inf count, sum, max]
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0.0]
+            series[index] += 1
+            series[-2] += value
+            if value > series[-1]:
+                series[-1] = value
+
+    def snapshot(self, *labels: str) -> Dict[str, Any]:
+        series = self._series.get(labels) or [0] * (len(self.buckets) + 1) + [0.0, 0.0]
+        counts = series[:-2]
+        total = sum(counts)
+        return {
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], counts)),
+            "count": total,
+            "sum": series[-2],
+            "mean": series[-2] / total if total else 0.0,
+            "max": series[-1],
+        }
+
+    def _items(self) -> Dict[Tuple[str, ...], List[float]]:
+        return {labels: list(series) for labels, series in self._series.items()}
+
+    def merge(self, dumps: List[Tuple[List[List[Any]], bool]]) -> Dict[Tuple[str, ...], List[float]]:
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        for series, _alive in dumps:
+            for labels, values in series:
+                total = merged.get(tuple(labels))
+                if total is None:
+                    merged[tuple(labels)] = list(values)
+                    continue
+                for i, value in enumerate(values[:-1]):
+                    total[i] += value
+                total[-1] = max(total[-1], values[-1])
+        return merged
+
+    def render(self, series_by_labels: Optional[Dict[Tuple[str, ...], List[float]]] = None) -> List[str]:
+        series_by_labels = self._items() if series_by_labels is None else series_by_labels
+        lines = self.header()
+        for labels, series in sorted(series_by_labels.items()):
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], series[:-2]):
+                cumulative += count
+                le = 'le="%s"' % (bound if bound == "+Inf" else _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {repr(float(series[-2]))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics rendered by /metrics. Callbacks registered with on_collect run
+    before every render or dump, to refresh values mirrored from elsewhere.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collect_hooks: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), aggregate: str = "sum") -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, aggregate))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def on_collect(self, callback: Callable[[], None]) -> None:
+        self._collect_hooks.append(callback)
+
+    def _run_collect_hooks(self) -> None:
+        for callback in self._collect_hooks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Metrics collect callback failed: {e}")
+
+    def dump(self) -> Dict[str, List[List[Any]]]:
+        self._run_collect_hooks()
+        return {name: metric.dump() for name, metric in self._metrics.items()}
+
+    def render(self, merged: Optional[Dict[str, Dict[Tuple[str, ...], Any]]] = None) -> str:
+        """Prometheus text for this process, or for values merged across processes"""
+        if merged is None:
+            self._run_collect_hooks()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render(None if merged is None else merged.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MultiProcessCollector:
+    """
+    Serves metrics for every worker process of one server from any of them.
+
+    Each worker writes its registry to <directory>/<pid>.json every
+    `interval` seconds and whenever it is scraped, and /metrics merges all
+    the files, so a scrape describes the whole service whichever worker
+    answers it. Counters and histograms are summed, including the last
+    values of workers that have exited, so totals never go backwards;
+    gauges combine live workers only. Other workers' values lag by at most
+    `interval` seconds.
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = 1.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"{os.getpid()}.json")
+
+    @classmethod
+    def from_env(cls, registry: MetricsRegistry) -> Optional["MultiProcessCollector"]:
+        """A collector over ML_METRICS_DIR, which serve.py sets when running several workers"""
+        directory = os.getenv("ML_METRICS_DIR")
+        if not directory:
+            return None
+        return cls(registry, directory, interval=float(os.getenv("ML_METRICS_WRITE_INTERVAL", "1")))
+
+    def write(self) -> None:
+        staging = f"{self.path}.tmp"
+        with open(staging, "w") as f:
+            json.dump(self.registry.dump(), f)
+        os.replace(staging, self.path)
+
+    def _read_all(self) -> List[Tuple[Dict[str, List[List[Any]]], bool]]:
+        dumps = []
+        for name in os.listdir(self.directory):
+            pid, _, extension = name.partition(".")
+            if extension != "json" or not pid.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    dumps.append((json.load(f), _process_alive(int(pid))))
+            except (OSError, ValueError) as e:
+                logger.error(f"Skipping unreadable metrics file {name}: {e}")
+        return dumps
+
+    def render(self) -> str:
+        self.write()
+        dumps = self._read_all()
+        merged = {
+            name: metric.merge([(dump.get(name, []), alive) for dump, alive in dumps])
+            for name, metric in self.registry._metrics.items()
+        }
+        return self.registry.render(merged)
+
+    async def run(self) -> None:
+        """Write this worker's metrics periodically; run as a background task."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Could not write metrics to {self.path}: {e}")
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "ml_http_request_duration_seconds", "HTTP request latency by route", LATENCY_BUCKETS, ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = registry.gauge("ml_http_requests_in_flight", "HTTP requests currently being served")
+STAGE_LATENCY = registry.histogram(
+    "ml_stage_duration_seconds",
+    "Time spent per prediction stage (validation, features, scaling, model, serialization)",
+    STAGE_BUCKETS,
+    ("stage",),
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_LATENCY.observe(seconds, stage)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency and in-flight requests.
+    Routes are labelled by their path template so label cardinality stays
+    bounded; anything the app does not route is labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Dict[Tuple[str, str], str] = {}
+
+    def _route_template(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return getattr(route, "path", "unmatched")
+
+        key = (scope["method"], scope["path"])
+        template = self._templates.get(key)
+        if template is None:
+            template = "unmatched"
+            for candidate in scope["app"].routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    template = getattr(candidate, "path", "unmatched")
+                    self._templates[key] = template
+                    break
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started, scope["method"], self._route_template(scope), str(status["code"])
+            )
+
+
+class SamplingProfiler:
+    """
+    Opt-in cProfile sampling of the inference hot path.
+
+    With sample_rate > 0, roughly that fraction of calls run under cProfile
+    (one at a time; concurrent calls are not profiled) and their stats are
+    accumulated until report() is called. At 0 the only cost is one float
+    comparison per call.
+    """
+
+    def __init__(self, sample_rate: float = 0.0):
+        self.sample_rate = sample_rate
+        self.samples = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._active = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        return cls(sample_rate=float(os.getenv("ML_PROFILE_SAMPLE_RATE", "0")))
+
+    def call(self, fn: Callable, *args):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate or not self._active.acquire(blocking=False):
+            return fn(*args)
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args)
+        finally:
+            self._active.release()
+            with self._stats_lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+                self.samples += 1
+
+    def report(self, limit: int = 30, sort: str = "cumulative", reset: bool = False) -> str:
+        with self._stats_lock:
+            if self._stats is None:
+                return f"No samples collected (sample_rate={self.sample_rate})\n"
+            buffer = io.StringIO()
+            self._stats.stream = buffer
+            buffer.write(f"{self.samples} sampled calls\n")
+            self._stats.sort_stats(sort).print_stats(limit)
+            if reset:
+                self._stats = None
+                self.samples = 0
+            return buffer.getvalue()
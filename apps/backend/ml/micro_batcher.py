@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_DELAY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class MicroBatcher:
+    """
+    Coalesces single-row predictions that arrive close together.
+
+    The first row to arrive opens a window of window_ms; every row submitted
+    before it closes (or until max_batch_size rows are queued) is scored with
+    one run_batch call and each caller gets its own result back.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[List[float]]], Awaitable[List[Dict[str, Any]]]],
+        window_ms: float = 2.0,
+        max_batch_size: int = 64,
+    ):
+        self.run_batch = run_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._queue: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self.batch_sizes = Histogram(
+            "ml_batch_size", "Rows per micro-batch sent to the model", BATCH_SIZE_BUCKETS
+        )
+        self.queue_delay = Histogram(
+            "ml_batch_queue_delay_seconds", "Time a row waits before its micro-batch is dispatched", QUEUE_DELAY_BUCKETS
+        )
+
+    @classmethod
+    def from_env(cls, run_batch) -> "MicroBatcher":
+        return cls(
+            run_batch,
+            window_ms=float(os.getenv("ML_BATCH_WINDOW_MS", "2")),
+            max_batch_size=int(os.getenv("ML_BATCH_MAX_SIZE", "64")),
+        )
+
+    async def submit(self, features: List[float]) -> Dict[str, Any]:
+        """Queue one feature row and wait for its result."""
+        if self.window <= 0:
+            return (await self.run_batch([features]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((features, future, time.perf_counter()))
+
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._queue = self._queue, []
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]) -> None:
+        dispatched_at = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self.queue_delay.observe(dispatched_at - enqueued_at)
+
+        await self._score(batch)
+
+    async def _score(self, batch: List[tuple]) -> None:
+        try:
+            results = await self.run_batch([features for features, _, _ in batch])
+        except BaseException as e:
+            if isinstance(e, ValueError) and len(batch) > 1:
+                # A malformed row fails the whole batch; rescore rows alone so only its caller sees the error
+                await asyncio.gather(*(self._score([entry]) for entry in batch))
+                return
+            for _, future, _ in batch:
+                if future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel()
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "queued": len(self._queue),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_delay_seconds": self.queue_delay.snapshot(),
+        }
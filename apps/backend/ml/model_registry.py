@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import inspect
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from predictionModel import (MANIFEST_FILE, MagajiCoMLPredictor, artifact_path_for, source_fingerprint,
+                             source_matches)
+
+logger = logging.getLogger(__name__)
+
+# Rows scored before a freshly loaded model is swapped in, so its pages are
+# mapped and its code paths exercised before live traffic reaches it
+WARMUP_ROWS = np.random.default_rng(0).uniform(0.0, 1.0, size=(256, 7))
+
+
+class ModelRegistry:
+    """
+    Holds the active predictor and replaces it without a restart.
+
+    A new model is loaded and warmed in a worker thread, then published with
+    a single reference assignment. Requests that already grabbed the old
+    predictor finish on it; everything after the swap sees the new one.
+    Each successful load bumps `revision`, and `version` combines it with the
+    model's own version string so downstream caches can key on it.
+    """
+
+    def __init__(self, model_path: str, watch_interval: float = 5.0):
+        self.model_path = model_path
+        self.watch_interval = watch_interval
+
+        self.revision = 0
+        self.loaded_at: Optional[datetime] = None
+        self.load_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+        self._active: Optional[MagajiCoMLPredictor] = None
+        self._fingerprint = None
+        self._listeners: List[Callable[[MagajiCoMLPredictor], Any]] = []
+        self._reload_lock = asyncio.Lock()
+
+        predictor, fingerprint, seconds = self._build()
+        self._publish(predictor, fingerprint, seconds)
+        self.last_error = self._source_mismatch(predictor)
+
+    @property
+    def active(self) -> MagajiCoMLPredictor:
+        return self._active
+
+    @property
+    def version(self) -> str:
+        return f"{self._active.model_version}#{self.revision}"
+
+    @property
+    def model_key(self) -> str:
+        """
+        Identity of the active model's files, the same in every worker
+        process that loaded them, for caches shared across processes.
+        """
+        digest = hashlib.blake2b(repr(self._fingerprint).encode(), digest_size=6).hexdigest()
+        return f"{self._active.model_version}@{digest}"
+
+    def add_listener(self, callback: Callable[[MagajiCoMLPredictor], Any]) -> None:
+        """Register a (sync or async) callback invoked with each newly swapped-in predictor."""
+        self._listeners.append(callback)
+
+    def _fingerprint_paths(self) -> Tuple[str, str]:
+        return os.path.join(artifact_path_for(self.model_path), MANIFEST_FILE), self.model_path
+
+    def fingerprint(self) -> Tuple:
+        """Identity of the on-disk model files; changes whenever either is rewritten."""
+        parts = []
+        for path in self._fingerprint_paths():
+            try:
+                stat = os.stat(path)
+                parts.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                parts.append(None)
+        return tuple(parts)
+
+    def _build(self) -> Tuple[MagajiCoMLPredictor, Tuple, float]:
+        started = time.perf_counter()
+        fingerprint = self.fingerprint()
+        predictor = MagajiCoMLPredictor(model_path=self.model_path)
+        predictor.predict_many(WARMUP_ROWS)
+        return predictor, fingerprint, time.perf_counter() - started
+
+    def _publish(self, predictor: MagajiCoMLPredictor, fingerprint: Tuple, seconds: float) -> None:
+        self._active = predictor
+        self._fingerprint = fingerprint
+        self.revision += 1
+        self.loaded_at = datetime.now(timezone.utc)
+        self.load_seconds = seconds
+        self.last_error = None
+        logger.info(f"✅ Model {self.version} active (loaded in {seconds * 1000:.1f}ms)")
+
+    def _source_mismatch(self, predictor: MagajiCoMLPredictor) -> Optional[str]:
+        """Why the loaded model is not the pickle now on disk, or None when it is"""
+        if source_matches(predictor.source, self.model_path):
+            return None
+        on_disk = source_fingerprint(self.model_path)
+        return f"loaded model was built from {predictor.source}, but {self.model_path} is now {on_disk}"
+
+    async def reload(self, force: bool = False) -> bool:
+        """Load, warm and swap in the model on disk; returns True if a new model went live."""
+        async with self._reload_lock:
+            if not force and self.fingerprint() == self._fingerprint:
+                return False
+
+            try:
+                predictor, fingerprint, seconds = await asyncio.to_thread(self._build)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"⚠️ Model reload failed, keeping {self.version}: {e}")
+                return False
+
+            # The predictor degrades to rules on a bad file; never trade a
+            # trained model for that because a write was caught half-way.
+            if self._active.get_model_info()["using_model"] and not predictor.get_model_info()["using_model"]:
+                self.last_error = "new model files could not be loaded"
+                logger.error(f"⚠️ Model reload produced no trained model, keeping {self.version}")
+                return False
+
+            # The pickle changed while loading; keep the current model and let the next poll retry
+            mismatch = self._source_mismatch(predictor)
+            if mismatch:
+                self.last_error = mismatch
+                logger.error(f"⚠️ Model reload did not match the files on disk, keeping {self.version}: {mismatch}")
+                return False
+
+            self._publish(predictor, fingerprint, seconds)
+
+        for callback in self._listeners:
+            try:
+                result = callback(predictor)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Model swap listener failed: {e}")
+        return True
+
+    async def watch(self) -> None:
+        """Poll the model files and hot-reload when they change; run as a background task."""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Model watcher error: {e}")
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **self._active.get_model_info(),
+            "active_version": self.version,
+            "revision": self.revision,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "load_ms": round(self.load_seconds * 1000.0, 3),
+            "last_reload_error": self.last_error,
+        }
@@ -1,12 +1,287 @@
 import numpy as np
 import logging
-from typing import Dict, List, Any, Optional
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import hashlib
+import json
 import pickle
 import os
+import shutil
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FEATURE_NAMES = [
+    "home_strength", "away_strength", "home_advantage",
+    "recent_form_home", "recent_form_away", "head_to_head", "injuries"
+]
+
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+class FlatForest:
+    """
+    Array-based RandomForest evaluator that needs nothing but NumPy.
+
+    All trees live in one set of contiguous node arrays: feature index,
+    threshold (already in raw feature units, the scaler is folded in),
+    children as (right, left) pairs and per-node class probabilities.
+    Leaves point to themselves with an +inf threshold, so a fixed max_depth
+    number of vectorized steps walks every row down every tree at once.
+    """
+
+    ARRAYS = ("feature", "threshold", "children", "value", "roots")
+
+    # Rows scored per traversal pass, bounding the (rows, trees) index matrix
+    CHUNK_SIZE = 1024
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth: int):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+        # children[node] is (right, left), so the flat view indexed with
+        # 2 * node + went_left gives the next node in one gather. reshape is
+        # a view, which keeps memory-mapped arrays shared and zero-copy.
+        self._next_node = children.reshape(-1)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def predict_proba(self, features_array: np.ndarray) -> np.ndarray:
+        """Average leaf class probabilities over all trees for an (N, F) matrix."""
+        if len(features_array) > self.CHUNK_SIZE:
+            return np.concatenate([
+                self.predict_proba(features_array[start:start + self.CHUNK_SIZE])
+                for start in range(0, len(features_array), self.CHUNK_SIZE)
+            ])
+
+        n_rows = len(features_array)
+        # Column-major flat copy so row r of feature f sits at f * n_rows + r
+        flat_features = np.ascontiguousarray(features_array.T).ravel()
+        row_offsets = np.arange(n_rows, dtype=np.int64)[:, None]
+
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        for _ in range(self.max_depth):
+            values = np.take(flat_features, np.take(self.feature, nodes) * n_rows + row_offsets)
+            went_left = values <= np.take(self.threshold, nodes)
+            nodes = np.take(self._next_node, nodes * 2 + went_left)
+
+        return np.take(self.value, nodes, axis=0).mean(axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+def compile_forest(model, scaler=None, n_classes: int = 3) -> FlatForest:
+    """
+    Flatten a fitted sklearn RandomForestClassifier (and the StandardScaler
+    it was trained behind) into a FlatForest. Only reads fitted attributes,
+    so sklearn itself is never imported here.
+    """
+    n_features = model.n_features_in_
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    if scaler is not None:
+        if getattr(scaler, "mean_", None) is not None:
+            mean = scaler.mean_
+        if getattr(scaler, "scale_", None) is not None:
+            scale = scaler.scale_
+
+    class_columns = np.asarray(model.classes_).astype(int)
+
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        feature = np.where(is_leaf, 0, tree.feature)
+        # x_scaled <= t  <=>  x <= t * scale + mean  (scale_ is always positive)
+        threshold = np.where(is_leaf, np.inf, tree.threshold * scale[feature] + mean[feature])
+        left = np.where(is_leaf, node_ids, tree.children_left) + offset
+        right = np.where(is_leaf, node_ids, tree.children_right) + offset
+        children.append(np.stack([right, left], axis=1))
+
+        counts = tree.value[:, 0, :]
+        value = np.zeros((tree.node_count, n_classes))
+        value[:, class_columns] = counts / counts.sum(axis=1, keepdims=True)
+
+        features.append(feature)
+        thresholds.append(threshold)
+        values.append(value)
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return FlatForest(
+        feature=np.concatenate(features).astype(np.int64),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        children=np.concatenate(children).astype(np.int64),
+        value=np.concatenate(values).astype(np.float64),
+        roots=np.array(roots, dtype=np.int64),
+        max_depth=max_depth,
+    )
+
+def artifact_path_for(model_path: str) -> str:
+    """Location of the array artifact exported alongside a model pickle."""
+    return os.path.splitext(model_path)[0] + ".artifact"
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_fingerprint(model_path: Optional[str], digest: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Size and mtime of a pickled model, plus its sha256 with digest=True;
+    recorded in the artifact compiled from it
+    """
+    try:
+        stat = os.stat(model_path)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if digest:
+            fingerprint["sha256"] = file_sha256(model_path)
+    except (FileNotFoundError, TypeError):
+        return None
+    return fingerprint
+
+def source_matches(recorded: Optional[Dict[str, Any]], model_path: Optional[str]) -> bool:
+    """
+    True if the pickle at model_path still holds the content a model was
+    built from. An unchanged size and mtime is trusted as is; otherwise the
+    file is hashed, so a copy, checkout or touch that keeps the bytes still
+    matches. Nothing recorded, or no pickle on disk, counts as a match.
+    """
+    current = source_fingerprint(model_path)
+    if recorded is None or current is None:
+        return True
+    if recorded.get("size") != current["size"]:
+        return False
+    if recorded.get("mtime_ns") == current["mtime_ns"]:
+        return True
+    if "sha256" not in recorded:
+        return False
+    try:
+        return file_sha256(model_path) == recorded["sha256"]
+    except OSError:
+        return False
+
+def artifact_is_current(path: str, model_path: Optional[str]) -> bool:
+    """
+    True unless the pickle next to the artifact has different content from
+    the one the artifact was compiled from. An artifact with no pickle
+    beside it is always current; one from before sources were recorded is
+    current unless the pickle is newer than its manifest.
+    """
+    current = source_fingerprint(model_path)
+    if current is None:
+        return True
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    try:
+        with open(manifest_path) as f:
+            recorded = json.load(f).get("source")
+        if recorded is None:
+            return os.stat(manifest_path).st_mtime_ns >= current["mtime_ns"]
+    except (OSError, ValueError):
+        return False
+    return source_matches(recorded, model_path)
+
+def save_artifact(
+    path: str,
+    forest: FlatForest,
+    version: str,
+    accuracy: float,
+    scaler=None,
+    source_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Write a model artifact directory: one raw .npy file per forest array plus
+    a JSON manifest. The directory is built next to the target and swapped in
+    with renames, so readers never see a half-written artifact and workers
+    still mapping the previous files keep valid pages. source_path is the
+    pickle the forest was compiled from; its fingerprint and content hash
+    let loaders detect a pickle that was replaced without re-exporting.
+    """
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "version": version,
+        "accuracy": float(accuracy),
+        "source": source_fingerprint(source_path, digest=True),
+        "feature_order": FEATURE_NAMES,
+        "scaler": {
+            "mean": [float(v) for v in scaler.mean_],
+            "scale": [float(v) for v in scaler.scale_],
+        } if scaler is not None else None,
+        "n_trees": forest.n_trees,
+        "n_nodes": forest.n_nodes,
+        "max_depth": forest.max_depth,
+        "arrays": {
+            name: {"dtype": str(getattr(forest, name).dtype), "shape": list(getattr(forest, name).shape)}
+            for name in FlatForest.ARRAYS
+        },
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    staging = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name in FlatForest.ARRAYS:
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(getattr(forest, name)))
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    previous = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, previous)
+    os.replace(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    return manifest
+
+def load_artifact(path: str, mmap: bool = True) -> Tuple[FlatForest, Dict[str, Any]]:
+    """
+    Open a model artifact. With mmap=True the arrays are mapped read-only,
+    so loading is near-instant and every process mapping the same files
+    shares one page-cached copy.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format_version')}")
+    if manifest.get("feature_order") != FEATURE_NAMES:
+        raise ValueError("Artifact feature order does not match the predictor")
+
+    mmap_mode = "r" if mmap else None
+    arrays = {}
+    for name in FlatForest.ARRAYS:
+        array = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        # Plain ndarray view over the same mapping; np.memmap's subclass hooks
+        # add measurable overhead to every gather on the hot path
+        arrays[name] = array.view(np.ndarray)
+    return FlatForest(max_depth=manifest["max_depth"], **arrays), manifest
+
+# Optional callable(stage, seconds) the service installs to record per-stage timings
+_stage_observer: Optional[Callable[[str, float], None]] = None
+
+def set_stage_observer(observer: Optional[Callable[[str, float], None]]) -> None:
+    global _stage_observer
+    _stage_observer = observer
+
 class MagajiCoMLPredictor:
     def __init__(self, model_path: Optional[str] = None):
         """
@@ -20,9 +295,28 @@ class MagajiCoMLPredictor:
 
         self.model = None
         self.scaler = None
+        self.forest: Optional[FlatForest] = None
+        # Fingerprint of the pickle this model came from (directly or via the artifact)
+        self.source: Optional[Dict[str, Any]] = None
+
+        artifact_path = artifact_path_for(model_path) if model_path else None
+        if artifact_path and os.path.isdir(artifact_path):
+            if not artifact_is_current(artifact_path, model_path):
+                logger.info(f"⚠️ Model artifact {artifact_path} was not built from {model_path}, loading the pickle")
+            else:
+                try:
+                    self.forest, manifest = load_artifact(artifact_path)
+                    self.model_version = manifest["version"]
+                    self.accuracy = manifest["accuracy"]
+                    self.source = manifest.get("source") or source_fingerprint(model_path)
+                    logger.info(f"✅ Mapped model artifact from {artifact_path}")
+                    return
+                except Exception as e:
+                    logger.error(f"⚠️ Failed to load model artifact: {e}, trying {model_path}")
 
         if model_path and os.path.exists(model_path):
             try:
+                self.source = source_fingerprint(model_path, digest=True)
                 with open(model_path, "rb") as f:
                     saved = pickle.load(f)
                     self.model = saved["model"]
@@ -30,6 +324,14 @@ class MagajiCoMLPredictor:
                 logger.info(f"✅ Loaded trained model from {model_path}")
             except Exception as e:
                 logger.error(f"⚠️ Failed to load model: {e}, falling back to rule-based")
+                self.source = None
+                return
+
+            try:
+                self.forest = compile_forest(self.model, self.scaler)
+                self.model = self.scaler = None
+            except Exception as e:
+                logger.info(f"Model could not be compiled ({e}), serving it through sklearn")
         else:
             logger.info("⚠️ No trained model found, using MagajiCo strategic v2.0 rules")
 
@@ -42,85 +344,130 @@ class MagajiCoMLPredictor:
         if len(features) < self.features_required:
             raise ValueError(f"At least {self.features_required} features required")
 
+        return self.predict_many([features])[0]
+
+    def predict_many(self, matrix) -> List[Dict[str, Any]]:
+        """
+        Predict outcomes for a batch of matches in a single pass.
+        Accepts an (N, 7) array-like of feature rows and returns one
+        result per row, in input order.
+        """
+        observe = _stage_observer
+        started = time.perf_counter() if observe else 0.0
+
+        features_array = np.asarray(matrix, dtype=np.float64)
+        if features_array.ndim != 2 or features_array.shape[1] != self.features_required:
+            raise ValueError(
+                f"Expected an (N, {self.features_required}) feature matrix, "
+                f"got shape {features_array.shape}"
+            )
+        if not np.isfinite(features_array).all():
+            row = int(np.flatnonzero(~np.isfinite(features_array).all(axis=1))[0])
+            raise ValueError(f"Features must be finite numbers, row {row} is {features_array[row].tolist()}")
+        if len(features_array) == 0:
+            return []
+
+        if observe:
+            started = self._observe_stage(observe, "validation", started)
+
         try:
-            if self.model:  # ML Model Path
-                features_array = np.array([features])
+            if self.forest is not None:  # Compiled forest path
+                probabilities = self.forest.predict_proba(features_array)
+                prediction_indices = np.argmax(probabilities, axis=1)
+            elif self.model:  # ML Model Path
                 features_scaled = self.scaler.transform(features_array)
-                probabilities = self.model.predict_proba(features_scaled)[0]
-                prediction_index = int(np.argmax(probabilities))
-
-                return {
-                    "prediction": self.prediction_types[prediction_index],
-                    "confidence": float(np.max(probabilities)),
-                    "probabilities": {
-                        "home": float(probabilities[0]),
-                        "draw": float(probabilities[1]),
-                        "away": float(probabilities[2])
-                    },
-                    "model_version": self.model_version
-                }
-
+                if observe:
+                    started = self._observe_stage(observe, "scaling", started)
+                probabilities = self.model.predict_proba(features_scaled)
+                prediction_indices = np.argmax(probabilities, axis=1)
             else:  # Rule-based fallback
-                home_strength, away_strength, home_advantage, recent_form_home, recent_form_away, head_to_head, injuries = features
-
-                # Strategic MagajiCo calculation
-                home_score = (
-                    home_strength * 0.3 +
-                    home_advantage * 0.2 +
-                    recent_form_home * 0.25 +
-                    head_to_head * 0.15 +
-                    injuries * 0.1
-                )
-
-                away_score = (
-                    away_strength * 0.3 +
-                    (1 - home_advantage) * 0.1 +
-                    recent_form_away * 0.25 +
-                    (1 - head_to_head) * 0.15 +
-                    injuries * 0.2
-                )
-
-                total_score = home_score + away_score + 0.5  # draw buffer
-                home_prob, away_prob, draw_prob = (
-                    home_score / total_score,
-                    away_score / total_score,
-                    0.5 / total_score
-                )
-
-                # normalize
-                total_prob = home_prob + draw_prob + away_prob
-                home_prob /= total_prob
-                draw_prob /= total_prob
-                away_prob /= total_prob
-
-                # select outcome
-                if home_prob > max(away_prob, draw_prob):
-                    prediction, confidence = "home", home_prob
-                elif away_prob > max(home_prob, draw_prob):
-                    prediction, confidence = "away", away_prob
-                else:
-                    prediction, confidence = "draw", draw_prob
-
-                return {
-                    "prediction": prediction,
-                    "confidence": float(confidence),
-                    "probabilities": {
-                        "home": float(home_prob),
-                        "draw": float(draw_prob),
-                        "away": float(away_prob)
-                    },
-                    "model_version": self.model_version
-                }
+                probabilities, prediction_indices = self._rule_based_probabilities(features_array)
+
+            if observe:
+                started = self._observe_stage(observe, "model", started)
+
+            results = [
+                self._format_result(probs, index)
+                for probs, index in zip(probabilities.tolist(), prediction_indices.tolist())
+            ]
+
+            if observe:
+                self._observe_stage(observe, "serialization", started)
+            return results
 
         except Exception as e:
             logger.error(f"Prediction error: {str(e)}")
             raise
 
+    @staticmethod
+    def _observe_stage(observe: Callable[[str, float], None], stage: str, started: float) -> float:
+        now = time.perf_counter()
+        observe(stage, now - started)
+        return now
+
+    @staticmethod
+    def _rule_based_probabilities(features: np.ndarray):
+        """
+        Strategic v2.0 scoring, vectorized over an (N, 7) matrix.
+        Mirrors the scalar formula operation-for-operation so results are
+        identical; returns ((N, 3) [home, draw, away] probabilities, (N,) indices).
+        """
+        home_strength, away_strength, home_advantage, recent_form_home, recent_form_away, head_to_head, injuries = features.T
+
+        # Strategic MagajiCo calculation
+        home_score = (
+            home_strength * 0.3 +
+            home_advantage * 0.2 +
+            recent_form_home * 0.25 +
+            head_to_head * 0.15 +
+            injuries * 0.1
+        )
+
+        away_score = (
+            away_strength * 0.3 +
+            (1 - home_advantage) * 0.1 +
+            recent_form_away * 0.25 +
+            (1 - head_to_head) * 0.15 +
+            injuries * 0.2
+        )
+
+        total_score = home_score + away_score + 0.5  # draw buffer
+        home_prob = home_score / total_score
+        away_prob = away_score / total_score
+        draw_prob = 0.5 / total_score
+
+        # normalize
+        total_prob = home_prob + draw_prob + away_prob
+        home_prob /= total_prob
+        draw_prob /= total_prob
+        away_prob /= total_prob
+
+        # select outcome: strict wins for home/away, ties go to draw
+        prediction_indices = np.where(
+            home_prob > np.maximum(away_prob, draw_prob), 0,
+            np.where(away_prob > np.maximum(home_prob, draw_prob), 2, 1)
+        )
+
+        return np.stack([home_prob, draw_prob, away_prob], axis=1), prediction_indices
+
+    def _format_result(self, probabilities: List[float], prediction_index: int) -> Dict[str, Any]:
+        return {
+            "prediction": self.prediction_types[prediction_index],
+            "confidence": float(probabilities[prediction_index]),
+            "probabilities": {
+                "home": float(probabilities[0]),
+                "draw": float(probabilities[1]),
+                "away": float(probabilities[2])
+            },
+            "model_version": self.model_version
+        }
+
     def get_model_info(self) -> Dict[str, Any]:
         return {
             "version": self.model_version,
             "accuracy": self.accuracy,
             "features_required": self.features_required,
             "prediction_types": self.prediction_types,
-            "using_model": bool(self.model)
+            "using_model": bool(self.model) or self.forest is not None,
+            "compiled_forest": self.forest is not None
         }
\ No newline at end of file
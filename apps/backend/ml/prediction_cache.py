@@ -0,0 +1,92 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache of prediction results.
+
+    Keys combine the registry model version with the feature vector rounded
+    to a multiple of `quantum`, so a hot-swapped model never serves results
+    computed by its predecessor. Only touched from the event loop, so no
+    locking is needed.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, quantum: float = 1e-4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.quantum = quantum
+
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "PredictionCache":
+        return cls(
+            max_entries=int(os.getenv("ML_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("ML_CACHE_TTL", "300")),
+            quantum=float(os.getenv("ML_CACHE_QUANTUM", "1e-4")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, version: str, features: List[float]) -> Tuple:
+        return (version, *(round(value / self.quantum) for value in features))
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: Tuple, result: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self, *_args) -> None:
+        """Drop every entry; registered as a model-swap listener."""
+        self._entries.clear()
+        self.invalidations += 1
+        logger.info("Prediction cache invalidated")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
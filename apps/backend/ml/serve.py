@@ -0,0 +1,82 @@
+"""
+Launch the prediction service with one or more uvicorn worker processes.
+
+    python serve.py                     # single process
+    ML_WORKERS=4 python serve.py        # four workers sharing model and cache
+
+Workers share the model by memory-mapping the same artifact files, so the
+forest sits once in the page cache however many workers map it. When
+several workers run, a SharedPredictionCache segment is created here and
+attached by name in every worker, and each worker writes its metrics into a
+shared directory so /metrics in any of them reports the whole service.
+"""
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+
+import uvicorn
+
+from predictionModel import artifact_is_current, artifact_path_for
+from shared_cache import SharedPredictionCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def ensure_artifact(model_path: str) -> None:
+    """
+    Export the mappable artifact from a pickled model if it is missing or
+    older than the pickle, so workers map one shared copy instead of each
+    unpickling its own forest
+    """
+    artifact_path = artifact_path_for(model_path)
+    if not os.path.exists(model_path) or (
+            os.path.isdir(artifact_path) and artifact_is_current(artifact_path, model_path)):
+        return
+
+    from train_model import export_forest, generate_training_data
+
+    try:
+        with open(model_path, "rb") as f:
+            saved = pickle.load(f)
+        X_check, _ = generate_training_data(2000, seed=7)
+        export_forest(saved["model"], saved["scaler"], X_check, saved.get("accuracy", 0.87),
+                      version=saved.get("version", "MagajiCo-v2.1"), model_path=model_path)
+    except Exception as e:
+        logger.error(f"⚠️ Could not export a model artifact ({e}), each worker will load {model_path}")
+
+
+def main():
+    workers = int(os.getenv("ML_WORKERS", "1"))
+    host = os.getenv("ML_HOST", "0.0.0.0")
+    port = int(os.getenv("ML_PORT", "8000"))
+    cache_size = int(os.getenv("ML_CACHE_SIZE", "10000"))
+
+    cache = None
+    metrics_dir = None
+    if workers > 1:
+        ensure_artifact(os.getenv("ML_MODEL_PATH", "model_data.pkl"))
+        # Parallelism comes from the worker processes; keep native pools from oversubscribing cores
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ.setdefault(var, "1")
+        if cache_size > 0:
+            cache = SharedPredictionCache.create(cache_size)
+            os.environ["ML_SHARED_CACHE_NAME"] = cache.shm.name
+        # A fresh directory per run, so totals never include an earlier server's
+        metrics_dir = tempfile.mkdtemp(prefix="ml-metrics-")
+        os.environ["ML_METRICS_DIR"] = metrics_dir
+
+    logger.info(f"🚀 Serving on {host}:{port} with {workers} worker(s)")
+    try:
+        uvicorn.run("main:app", host=host, port=port, workers=workers)
+    finally:
+        if cache is not None:
+            cache.close()
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import os
+import time
+import zlib
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_TYPES = ("home", "draw", "away")
+
+# One 64-byte slot per entry: tag, generation, expires_at, 3 probabilities,
+# prediction index, checksum over the first seven words
+SLOT_WORDS = 8
+TAG, GENERATION, EXPIRES_AT, PROBABILITIES, INDEX, CHECKSUM = 0, 1, 2, slice(3, 6), 6, 7
+HEADER_BYTES = 64
+PROBES = 4
+
+
+def _checksum(words: np.ndarray) -> int:
+    return zlib.crc32(words[:CHECKSUM].tobytes()) | 1
+
+
+class SharedPredictionCache:
+    """
+    Prediction result cache shared by every worker process.
+
+    Entries live in a fixed open-addressing table inside a
+    multiprocessing.shared_memory segment, so there are no locks: a writer
+    overwrites a whole 64-byte slot and a reader copies it out and checks
+    the embedded checksum, treating a torn or concurrently rewritten slot
+    as a miss. Each key hashes to PROBES adjacent slots; when all are live
+    the home slot is overwritten, so the table degrades by losing entries
+    rather than by slowing down.
+
+    Keys follow PredictionCache.key(); their first element is the model key
+    ("<model_version>@<digest>"), whose version half is used to rebuild
+    results. clear() bumps a generation counter in the header, which
+    invalidates every slot at once in all processes. Hit and miss counters
+    are per process.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, ttl: float = 300.0, quantum: float = 1e-4,
+                 owner: bool = False):
+        self.shm = shm
+        self.ttl = ttl
+        self.quantum = quantum
+        self.owner = owner
+
+        self.slots = (shm.size - HEADER_BYTES) // (SLOT_WORDS * 8)
+        self._header = np.ndarray((HEADER_BYTES // 8,), dtype=np.uint64, buffer=shm.buf)
+        self._words = np.ndarray((self.slots, SLOT_WORDS), dtype=np.uint64, buffer=shm.buf, offset=HEADER_BYTES)
+        self._values = self._words.view(np.float64)
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.torn_reads = 0
+        self.invalidations = 0
+
+    @property
+    def max_entries(self) -> int:
+        return self.slots
+
+    @property
+    def enabled(self) -> bool:
+        return self.slots > 0
+
+    @classmethod
+    def create(cls, max_entries: int, ttl: float = 300.0, quantum: float = 1e-4) -> "SharedPredictionCache":
+        """Allocate a zeroed table; call from the parent process before starting workers"""
+        size = HEADER_BYTES + max(1, max_entries) * SLOT_WORDS * 8
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        np.ndarray((size,), dtype=np.uint8, buffer=shm.buf)[:] = 0
+        logger.info(f"✅ Shared prediction cache {shm.name}: {max_entries} slots, {size / 1e6:.1f}MB")
+        return cls(shm, ttl=ttl, quantum=quantum, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, ttl: float = 300.0, quantum: float = 1e-4) -> "SharedPredictionCache":
+        # Workers spawned by serve.py share its resource tracker, so the
+        # segment stays registered once and is unlinked by the creator only
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, ttl=ttl, quantum=quantum)
+
+    @classmethod
+    def from_env(cls) -> "SharedPredictionCache":
+        return cls.attach(
+            os.environ["ML_SHARED_CACHE_NAME"],
+            ttl=float(os.getenv("ML_CACHE_TTL", "300")),
+            quantum=float(os.getenv("ML_CACHE_QUANTUM", "1e-4")),
+        )
+
+    def key(self, version: str, features: List[float]) -> Tuple:
+        return (version, *(round(value / self.quantum) for value in features))
+
+    def _tag(self, key: Tuple) -> int:
+        # Python's hash() is salted per process, so derive a stable tag instead
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") | 1
+
+    def _probe(self, tag: int) -> range:
+        home = tag % self.slots
+        return range(home, home + min(PROBES, self.slots))
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        tag = self._tag(key)
+        generation = int(self._header[0])
+        for i in self._probe(tag):
+            words = self._words[i % self.slots].copy()
+            if int(words[TAG]) != tag:
+                continue
+            if int(words[CHECKSUM]) != _checksum(words):
+                self.torn_reads += 1
+                break
+            values = words.view(np.float64)
+            if int(words[GENERATION]) != generation:
+                break
+            if values[EXPIRES_AT] < time.time():
+                self.expired += 1
+                break
+
+            self.hits += 1
+            index = int(words[INDEX])
+            probabilities = values[PROBABILITIES].tolist()
+            return {
+                "prediction": PREDICTION_TYPES[index],
+                "confidence": probabilities[index],
+                "probabilities": dict(zip(PREDICTION_TYPES, probabilities)),
+                "model_version": key[0].partition("@")[0],
+            }
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple, result: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        tag = self._tag(key)
+        generation = int(self._header[0])
+        now = time.time()
+
+        target = None
+        for i in self._probe(tag):
+            slot = i % self.slots
+            words = self._words[slot]
+            if int(words[TAG]) in (0, tag) or int(words[GENERATION]) != generation \
+                    or self._values[slot, EXPIRES_AT] < now:
+                target = slot
+                break
+        if target is None:
+            target = tag % self.slots
+            self.evictions += 1
+
+        entry = np.zeros(SLOT_WORDS, dtype=np.uint64)
+        values = entry.view(np.float64)
+        entry[TAG] = tag
+        entry[GENERATION] = generation
+        values[EXPIRES_AT] = now + self.ttl
+        values[PROBABILITIES] = [result["probabilities"][name] for name in PREDICTION_TYPES]
+        entry[INDEX] = PREDICTION_TYPES.index(result["prediction"])
+        entry[CHECKSUM] = _checksum(entry)
+        self._words[target] = entry
+
+    def clear(self, *_args) -> None:
+        """Invalidate every entry in all processes; registered as a model-swap listener."""
+        self._header[0] += 1
+        self.invalidations += 1
+        logger.info("Shared prediction cache invalidated")
+
+    def stats(self) -> Dict[str, Any]:
+        live = (
+            (self._words[:, TAG] != 0)
+            & (self._words[:, GENERATION] == self._header[0])
+            & (self._values[:, EXPIRES_AT] >= time.time())
+        )
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "shared": True,
+            "segment": self.shm.name,
+            "entries": int(live.sum()),
+            "max_entries": self.slots,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "torn_reads": self.torn_reads,
+            "invalidations": self.invalidations,
+        }
+
+    def close(self) -> None:
+        del self._header, self._words, self._values
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Per-team vector layout; home_advantage is optional in the source file
+TEAM_COLUMNS = ("strength", "form", "injuries", "home_advantage")
+REQUIRED_TEAM_COLUMNS = ("team_id", "strength", "form", "injuries")
+HEAD_TO_HEAD_COLUMNS = ("home_team_id", "away_team_id", "head_to_head")
+
+
+def read_table(path: str):
+    """Load a CSV or Parquet file (chosen by extension) as a DataFrame"""
+    import pandas as pd
+
+    if path.endswith((".parquet", ".pq")):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def read_teams(path: str) -> Tuple[List[str], np.ndarray]:
+    """Team ids and their (N, len(TEAM_COLUMNS)) feature vectors; missing values are NaN"""
+    frame = read_table(path)
+    missing = [column for column in REQUIRED_TEAM_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"{path} is missing columns: {missing}")
+
+    frame = frame.drop_duplicates("team_id", keep="last")
+    vectors = np.full((len(frame), len(TEAM_COLUMNS)), np.nan)
+    for i, column in enumerate(TEAM_COLUMNS):
+        if column in frame.columns:
+            vectors[:, i] = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return frame["team_id"].astype(str).tolist(), vectors
+
+
+def read_head_to_head(path: str) -> Tuple[Dict[Tuple[str, str], int], np.ndarray]:
+    """(home_team_id, away_team_id) -> slot index, and the head-to-head value per slot"""
+    frame = read_table(path)
+    missing = [column for column in HEAD_TO_HEAD_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"{path} is missing columns: {missing}")
+
+    frame = frame.dropna(subset=["head_to_head"]).drop_duplicates(["home_team_id", "away_team_id"], keep="last")
+    pairs = zip(frame["home_team_id"].astype(str).tolist(), frame["away_team_id"].astype(str).tolist())
+    index = {pair: slot for slot, pair in enumerate(pairs)}
+    return index, frame["head_to_head"].to_numpy(dtype=np.float64)
+
+
+class TeamFeatureStore:
+    """
+    In-process lookup of per-team features and head-to-head values by team id.
+
+    Team rows live in one float64 array with a dict from team id to row, so
+    assembling a match's features is a couple of dict lookups. The source
+    files are polled; on change the file is re-read off the event loop and
+    only teams whose vectors differ are rewritten in place. Rows of removed
+    teams are recycled. The head-to-head table is small and swapped whole.
+    Lookups and updates both run on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, teams_path: Optional[str] = None, head_to_head_path: Optional[str] = None,
+                 watch_interval: float = 30.0):
+        self.teams_path = teams_path
+        self.head_to_head_path = head_to_head_path
+        self.watch_interval = watch_interval
+
+        self._index: Dict[str, int] = {}
+        self._vectors = np.full((0, len(TEAM_COLUMNS)), np.nan)
+        self._free_rows: List[int] = []
+        self._head_to_head: Tuple[Dict[Tuple[str, str], int], np.ndarray] = ({}, np.empty(0))
+        self._fingerprints: Dict[str, Any] = {}
+
+        self.revision = 0
+        self.loaded_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.last_refresh: Dict[str, int] = {}
+
+        if self.enabled:
+            # A bad file must not stop the service; start empty and let the watcher retry
+            try:
+                self.apply(self._read_changed(force=True))
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"⚠️ Could not load team features, starting with an empty store: {e}")
+
+    @classmethod
+    def from_env(cls) -> "TeamFeatureStore":
+        return cls(
+            teams_path=os.getenv("ML_TEAM_FEATURES_PATH") or None,
+            head_to_head_path=os.getenv("ML_HEAD_TO_HEAD_PATH") or None,
+            watch_interval=float(os.getenv("ML_TEAM_FEATURES_WATCH_INTERVAL", "30")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.teams_path or self.head_to_head_path)
+
+    def _fingerprint(self, path: str):
+        try:
+            stat = os.stat(path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _read_changed(self, force: bool = False) -> Dict[str, Any]:
+        """Read whichever source files changed since the last refresh; runs in a worker thread"""
+        update = {}
+        for name, path, reader in (("teams", self.teams_path, read_teams),
+                                   ("head_to_head", self.head_to_head_path, read_head_to_head)):
+            if not path:
+                continue
+            fingerprint = self._fingerprint(path)
+            if fingerprint is None or (not force and fingerprint == self._fingerprints.get(name)):
+                continue
+            update[name] = (fingerprint, reader(path))
+        return update
+
+    def apply(self, update: Dict[str, Any]) -> Dict[str, int]:
+        """Fold freshly read sources into the store; returns counts of what changed"""
+        counts = {}
+        if "teams" in update:
+            fingerprint, (team_ids, vectors) = update["teams"]
+            counts.update(self._apply_teams(team_ids, vectors))
+            self._fingerprints["teams"] = fingerprint
+        if "head_to_head" in update:
+            fingerprint, head_to_head = update["head_to_head"]
+            self._head_to_head = head_to_head
+            self._fingerprints["head_to_head"] = fingerprint
+            counts["head_to_head_pairs"] = len(head_to_head[0])
+
+        if counts:
+            self.revision += 1
+            self.loaded_at = datetime.now(timezone.utc)
+            self.last_error = None
+            self.last_refresh = counts
+            logger.info(f"✅ Team features revision {self.revision}: {counts}")
+        return counts
+
+    def _apply_teams(self, team_ids: List[str], vectors: np.ndarray) -> Dict[str, int]:
+        rows = np.fromiter((self._index.get(team_id, -1) for team_id in team_ids), dtype=np.int64, count=len(team_ids))
+        known = rows >= 0
+
+        # Existing teams: rewrite only the rows whose vectors actually moved
+        current = self._vectors[rows[known]]
+        incoming = vectors[known]
+        same = (current == incoming) | (np.isnan(current) & np.isnan(incoming))
+        changed = ~same.all(axis=1)
+        self._vectors[rows[known][changed]] = incoming[changed]
+
+        seen = set(team_ids)
+        removed = [team_id for team_id in self._index if team_id not in seen]
+        for team_id in removed:
+            row = self._index.pop(team_id)
+            self._vectors[row] = np.nan
+            self._free_rows.append(row)
+
+        added = np.flatnonzero(~known)
+        shortfall = len(added) - len(self._free_rows)
+        if shortfall > 0:
+            capacity = max(len(self._vectors) * 2, len(self._vectors) + shortfall, 64)
+            grown = np.full((capacity, len(TEAM_COLUMNS)), np.nan)
+            grown[:len(self._vectors)] = self._vectors
+            self._free_rows.extend(range(capacity - 1, len(self._vectors) - 1, -1))
+            self._vectors = grown
+        for i in added:
+            row = self._free_rows.pop()
+            self._vectors[row] = vectors[i]
+            self._index[team_ids[i]] = row
+
+        return {"teams_added": len(added), "teams_updated": int(changed.sum()), "teams_removed": len(removed)}
+
+    async def refresh(self, force: bool = False) -> Dict[str, int]:
+        try:
+            update = await asyncio.to_thread(self._read_changed, force)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"⚠️ Team feature refresh failed, keeping revision {self.revision}: {e}")
+            return {}
+        return self.apply(update)
+
+    async def watch(self) -> None:
+        """Poll the source files and fold in changes; run as a background task."""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            await self.refresh()
+
+    def head_to_head(self, home_team_id: str, away_team_id: str) -> Optional[float]:
+        """Head-to-head value from the home side's view; a reversed fixture is mirrored"""
+        index, values = self._head_to_head
+        slot = index.get((home_team_id, away_team_id))
+        if slot is not None:
+            return float(values[slot])
+        slot = index.get((away_team_id, home_team_id))
+        if slot is not None:
+            return 1.0 - float(values[slot])
+        return None
+
+    def match_features(self, home_team_id: Optional[str], away_team_id: Optional[str]) -> Dict[str, float]:
+        """Whatever match features the store knows for this fixture, keyed by FEATURE_NAMES"""
+        features = {}
+        home = self._index.get(home_team_id) if home_team_id else None
+        if home is not None:
+            strength, form, injuries, home_advantage = self._vectors[home].tolist()
+            features.update(home_strength=strength, recent_form_home=form,
+                            injuries=injuries, home_advantage=home_advantage)
+        away = self._index.get(away_team_id) if away_team_id else None
+        if away is not None:
+            strength, form, _, _ = self._vectors[away].tolist()
+            features.update(away_strength=strength, recent_form_away=form)
+        if home_team_id and away_team_id:
+            features["head_to_head"] = self.head_to_head(home_team_id, away_team_id)
+
+        # NaN or missing entries fall through to the caller's stats or defaults
+        return {name: value for name, value in features.items() if value is not None and value == value}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "teams": len(self._index),
+            "head_to_head_pairs": len(self._head_to_head[0]),
+            "revision": self.revision,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "last_refresh": self.last_refresh,
+            "last_error": self.last_error,
+            "memory_bytes": int(self._vectors.nbytes + self._head_to_head[1].nbytes),
+        }
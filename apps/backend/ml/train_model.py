@@ -1,72 +1,145 @@
 
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pickle
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import logging
+from predictionModel import FEATURE_NAMES, artifact_path_for, compile_forest, save_artifact
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def generate_training_data(n_samples=10000):
+# Uniform sampling range of each synthetic feature, in FEATURE_NAMES order
+FEATURE_RANGES = np.array([
+    (0.3, 1.0),  # home_strength
+    (0.3, 1.0),  # away_strength
+    (0.5, 0.8),  # home_advantage
+    (0.2, 1.0),  # recent_form_home
+    (0.2, 1.0),  # recent_form_away
+    (0.3, 0.7),  # head_to_head
+    (0.4, 1.0),  # injuries
+])
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+def label_outcomes(X):
+    """
+    Vectorized outcome labels for an (N, 7) feature matrix.
+    Labels: 0=home win, 1=draw, 2=away win
+    """
+    home_strength, away_strength, home_advantage, recent_form_home, recent_form_away, head_to_head, injuries = X.T
+
+    home_score = (
+        home_strength * 0.3 +
+        home_advantage * 0.2 +
+        recent_form_home * 0.25 +
+        head_to_head * 0.15 +
+        injuries * 0.1
+    )
+
+    away_score = (
+        away_strength * 0.3 +
+        (1 - home_advantage) * 0.1 +
+        recent_form_away * 0.25 +
+        (1 - head_to_head) * 0.15 +
+        injuries * 0.2
+    )
+
+    diff = home_score - away_score
+    return np.where(diff > 0.15, 0, np.where(diff < -0.15, 2, 1)).astype(np.int8)
+
+def _sample_block(rng, n_samples, dtype=np.float64):
+    X = rng.uniform(FEATURE_RANGES[:, 0], FEATURE_RANGES[:, 1], size=(n_samples, len(FEATURE_RANGES)))
+    y = label_outcomes(X)
+    return X.astype(dtype, copy=False), y
+
+def generate_training_data(n_samples=10000, seed=42):
     """
     Generate synthetic training data for sports predictions.
     Features: [home_strength, away_strength, home_advantage, 
                recent_form_home, recent_form_away, head_to_head, injuries]
     Labels: 0=home win, 1=draw, 2=away win
     """
-    np.random.seed(42)
-    
-    X = []
-    y = []
-    
-    for _ in range(n_samples):
-        home_strength = np.random.uniform(0.3, 1.0)
-        away_strength = np.random.uniform(0.3, 1.0)
-        home_advantage = np.random.uniform(0.5, 0.8)
-        recent_form_home = np.random.uniform(0.2, 1.0)
-        recent_form_away = np.random.uniform(0.2, 1.0)
-        head_to_head = np.random.uniform(0.3, 0.7)
-        injuries = np.random.uniform(0.4, 1.0)
-        
-        features = [
-            home_strength, away_strength, home_advantage,
-            recent_form_home, recent_form_away, head_to_head, injuries
-        ]
-        
-        # Calculate outcome probabilities
-        home_score = (
-            home_strength * 0.3 +
-            home_advantage * 0.2 +
-            recent_form_home * 0.25 +
-            head_to_head * 0.15 +
-            injuries * 0.1
-        )
-        
-        away_score = (
-            away_strength * 0.3 +
-            (1 - home_advantage) * 0.1 +
-            recent_form_away * 0.25 +
-            (1 - head_to_head) * 0.15 +
-            injuries * 0.2
+    return _sample_block(np.random.default_rng(seed), n_samples)
+
+def _write_chunk(args):
+    path, seed_sequence, n_samples, dtype = args
+    X, y = _sample_block(np.random.default_rng(seed_sequence), n_samples, dtype)
+    np.savez(path, X=X, y=y)
+    return path
+
+def generate_dataset(out_dir, n_samples, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=None, seed=42, dtype=np.float32):
+    """
+    Write a synthetic dataset to out_dir as chunk_00000.npz, chunk_00001.npz, ...
+    (arrays X and y) plus dataset.json describing it.
+
+    Every chunk draws from its own stream spawned from one SeedSequence, so
+    the output is reproducible for a given seed and chunk_size no matter how
+    many processes generate it. Memory stays at one chunk per process.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n_chunks = -(-n_samples // chunk_size)
+    streams = np.random.SeedSequence(seed).spawn(n_chunks)
+    jobs = [
+        (
+            os.path.join(out_dir, f"chunk_{index:05d}.npz"),
+            streams[index],
+            min(chunk_size, n_samples - index * chunk_size),
+            dtype,
         )
-        
-        # Determine outcome
-        diff = home_score - away_score
-        if diff > 0.15:
-            label = 0  # home win
-        elif diff < -0.15:
-            label = 2  # away win
-        else:
-            label = 1  # draw
-        
-        X.append(features)
-        y.append(label)
-    
-    return np.array(X), np.array(y)
+        for index in range(n_chunks)
+    ]
+
+    if n_jobs == 1 or n_chunks == 1:
+        paths = [_write_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            paths = list(pool.map(_write_chunk, jobs))
+
+    # Chunks left by an earlier, larger generation would otherwise be picked
+    # up by iter_dataset_chunks as newly added data
+    written = {os.path.basename(path) for path in paths}
+    for name in os.listdir(out_dir):
+        if name.startswith("chunk_") and name.endswith(".npz") and name not in written:
+            os.remove(os.path.join(out_dir, name))
+
+    with open(os.path.join(out_dir, "dataset.json"), "w") as f:
+        json.dump({
+            "n_samples": n_samples,
+            "chunk_size": chunk_size,
+            "seed": seed,
+            "dtype": np.dtype(dtype).name,
+            "feature_order": FEATURE_NAMES,
+            "chunks": [os.path.basename(path) for path in paths],
+        }, f, indent=2)
 
-def train_model():
+    logger.info(f"✅ Generated {n_samples} samples in {n_chunks} chunks under {out_dir}")
+    return paths
+
+def export_forest(model, scaler, X_check, accuracy, version="MagajiCo-v2.1", model_path="model_data.pkl"):
+    """Compile the fitted forest into a memory-mappable artifact for sklearn-free serving"""
+    forest = compile_forest(model, scaler)
+    max_diff = float(np.abs(
+        forest.predict_proba(X_check) - model.predict_proba(scaler.transform(X_check))
+    ).max())
+    if max_diff > 1e-6:
+        logger.warning(f"⚠️ Compiled forest deviates from predict_proba by {max_diff:.2e}")
+
+    artifact_path = artifact_path_for(model_path)
+    save_artifact(artifact_path, forest, version=version, accuracy=accuracy, scaler=scaler, source_path=model_path)
+    logger.info(
+        f"✅ Compiled forest ({forest.n_trees} trees, {forest.n_nodes} nodes) "
+        f"saved to {artifact_path}, max |Δp| = {max_diff:.2e}"
+    )
+    return forest
+
+def train_model(model_path="model_data.pkl"):
     """Train Random Forest model for match predictions"""
     logger.info("🏋️ Starting model training...")
     
@@ -110,11 +183,163 @@ def train_model():
         "version": "MagajiCo-v2.1"
     }
     
-    with open("model_data.pkl", "wb") as f:
+    with open(model_path, "wb") as f:
         pickle.dump(model_data, f)
     
-    logger.info("✅ Model saved to model_data.pkl")
+    logger.info(f"✅ Model saved to {model_path}")
+
+    export_forest(model, scaler, X_test, accuracy=test_score, version=model_data["version"], model_path=model_path)
+    return model, scaler, test_score
+
+def iter_dataset_chunks(data_dir, skip=()):
+    """
+    Yield (name, X, y) for each chunk of a dataset directory, one chunk in
+    memory at a time: the chunks listed in dataset.json first, then any
+    chunk_*.npz files added to the directory since, in name order. Chunks
+    named in skip are not read at all.
+    """
+    on_disk = sorted(name for name in os.listdir(data_dir) if name.startswith("chunk_") and name.endswith(".npz"))
+    manifest_path = os.path.join(data_dir, "dataset.json")
+    names = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            names = json.load(f)["chunks"]
+    listed = set(names)
+    names = names + [name for name in on_disk if name not in listed]
+
+    for name in names:
+        if name in skip:
+            continue
+        with np.load(os.path.join(data_dir, name)) as chunk:
+            yield name, chunk["X"], chunk["y"]
+
+def _save_checkpoint(checkpoint_path, state):
+    staging = f"{checkpoint_path}.tmp"
+    with open(staging, "wb") as f:
+        pickle.dump(state, f)
+    os.replace(staging, checkpoint_path)
+
+def train_incremental(
+    data_dir,
+    trees_per_chunk=10,
+    checkpoint_path="model_checkpoint.pkl",
+    resume=True,
+    eval_fraction=0.1,
+    max_eval_rows=200_000,
+    model_path="model_data.pkl",
+):
+    """
+    Out-of-core training over a chunked dataset (see generate_dataset).
+
+    The scaler is fitted with one streaming partial_fit pass, then the forest
+    grows by trees_per_chunk warm-started trees per chunk, so only one chunk
+    is ever in memory. The last eval_fraction of each chunk is held out
+    (capped at max_eval_rows) for the final accuracy. After every chunk the
+    model, scaler and list of finished chunks are checkpointed; with resume,
+    a rerun skips finished chunks and only adds trees for new ones, which is
+    how a growing match history is retrained.
+    """
+    state = None
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "rb") as f:
+            state = pickle.load(f)
+        logger.info(
+            f"♻️ Resuming from {checkpoint_path}: {len(state['chunks_done'])} chunks, "
+            f"{len(state['model'].estimators_)} trees"
+        )
+
+    if state is None:
+        logger.info("📏 Fitting scaler over all chunks...")
+        scaler = StandardScaler()
+        for _, X, _ in iter_dataset_chunks(data_dir):
+            scaler.partial_fit(X)
+
+        model = RandomForestClassifier(
+            n_estimators=trees_per_chunk,
+            max_depth=10,
+            random_state=42,
+            n_jobs=-1,
+            warm_start=True
+        )
+        state = {"model": model, "scaler": scaler, "chunks_done": [], "eval_X": [], "eval_y": []}
+
+    model, scaler = state["model"], state["scaler"]
+    eval_rows = sum(len(part) for part in state["eval_y"])
+
+    for name, X, y in iter_dataset_chunks(data_dir, skip=set(state["chunks_done"])):
+        n_fit = len(X) - int(len(X) * eval_fraction)
+        # Warm-started trees must all see the same classes_ to be averaged
+        if len(np.unique(y[:n_fit])) < 3:
+            logger.warning(f"⚠️ Skipping {name}: not every outcome class is present")
+            continue
+
+        if hasattr(model, "estimators_"):
+            model.set_params(n_estimators=len(model.estimators_) + trees_per_chunk)
+
+        logger.info(f"🔧 Fitting {trees_per_chunk} trees on {name} ({n_fit} rows)...")
+        model.fit(scaler.transform(X[:n_fit]), y[:n_fit])
+
+        if eval_rows < max_eval_rows and n_fit < len(X):
+            take = min(len(X) - n_fit, max_eval_rows - eval_rows)
+            state["eval_X"].append(X[n_fit:n_fit + take])
+            state["eval_y"].append(y[n_fit:n_fit + take])
+            eval_rows += take
+
+        state["chunks_done"].append(name)
+        _save_checkpoint(checkpoint_path, state)
+
+    if not hasattr(model, "estimators_"):
+        raise ValueError(f"No usable chunks found in {data_dir}")
+
+    X_eval = np.concatenate(state["eval_X"]) if state["eval_X"] else None
+    test_score = None
+    if X_eval is not None:
+        test_score = model.score(scaler.transform(X_eval), np.concatenate(state["eval_y"]))
+        logger.info(f"📊 Held-out accuracy: {test_score:.3f}")
+    logger.info(f"🌲 {len(model.estimators_)} trees over {len(state['chunks_done'])} chunks")
+
+    model_data = {
+        "model": model,
+        "scaler": scaler,
+        "accuracy": test_score,
+        "version": "MagajiCo-v2.1"
+    }
+    with open(model_path, "wb") as f:
+        pickle.dump(model_data, f)
+    logger.info(f"✅ Model saved to {model_path}")
+
+    # Fresh float64 rows: float32 chunk rows sit on the same grid the split
+    # thresholds were cut from, which would exaggerate rounding differences
+    X_check, _ = generate_training_data(10000, seed=7)
+    export_forest(model, scaler, X_check, accuracy=test_score or 0.0, version=model_data["version"], model_path=model_path)
     return model, scaler, test_score
 
+def main():
+    parser = argparse.ArgumentParser(description="Train the MagajiCo match model")
+    subcommands = parser.add_subparsers(dest="command")
+
+    subcommands.add_parser("train", help="train on freshly generated data (default)")
+
+    generate = subcommands.add_parser("generate", help="write a chunked synthetic dataset to disk")
+    generate.add_argument("out_dir")
+    generate.add_argument("--samples", type=int, default=10_000_000)
+    generate.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    generate.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    generate.add_argument("--seed", type=int, default=42)
+
+    incremental = subcommands.add_parser("incremental", help="train out-of-core over a chunked dataset")
+    incremental.add_argument("data_dir")
+    incremental.add_argument("--trees-per-chunk", type=int, default=10)
+    incremental.add_argument("--checkpoint", default="model_checkpoint.pkl")
+    incremental.add_argument("--no-resume", action="store_true", help="ignore an existing checkpoint")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate_dataset(args.out_dir, args.samples, args.chunk_size, args.jobs, args.seed)
+    elif args.command == "incremental":
+        train_incremental(args.data_dir, args.trees_per_chunk, args.checkpoint, resume=not args.no_resume)
+    else:
+        train_model()
+
 if __name__ == "__main__":
-    train_model()
+    main()
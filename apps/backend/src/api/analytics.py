@@ -1,20 +1,234 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
 from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Callable, Optional, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+import asyncio
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 MONGO_URI = os.getenv("MONGODB_URI") or os.getenv("DATABASE_URL") or "mongodb://localhost:27017"
 DB_NAME = os.getenv("MONGO_DB_NAME", "sports_central")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+# Fail operations quickly while Mongo is unreachable instead of after pymongo's 30s default
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+
+# write-behind batching for install records
+INSTALL_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "100"))
+INSTALL_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "1.0"))
+INSTALL_MAX_BUFFERED = int(os.getenv("ANALYTICS_MAX_BUFFERED", "10000"))
+
+DUPLICATE_KEY_ERROR = 11000
+# Per-document write error codes worth retrying (transient server/replica-set states)
+RETRYABLE_WRITE_ERRORS = {6, 7, 89, 91, 112, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
 
 # simple API key guard for these endpoints
 ANALYTICS_API_KEY = os.getenv("ANALYTICS_API_KEY", None)
 
+_client: Optional[AsyncIOMotorClient] = None
+
 def get_db_client() -> AsyncIOMotorClient:
-    return AsyncIOMotorClient(MONGO_URI)
+    """One pooled client for the application lifetime; Motor connects lazily."""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        )
+    return _client
+
+def get_installs_collection():
+    return get_db_client()[DB_NAME]["pwa_installs"]
+
+FIRST_INSTALL_SORT = [("installedAt", 1), ("createdAt", 1)]
+
+async def ensure_indexes():
+    """Create the indexes the analytics queries rely on; a no-op when they already exist."""
+    coll = get_installs_collection()
+    await coll.create_index(FIRST_INSTALL_SORT, name="installedAt_1_createdAt_1")
+    await coll.create_index([("clientId", 1), ("installedAt", 1)], name="clientId_1_installedAt_1")
+
+def to_mongo_datetime(value: datetime) -> datetime:
+    """Naive UTC at millisecond precision, i.e. exactly what Mongo stores and returns."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def first_install_key(doc: dict) -> Tuple[datetime, datetime]:
+    return doc["installedAt"], doc["createdAt"]
+
+class FirstInstallCache:
+    """
+    Keeps the earliest install record in memory.
+
+    The first read loads it from Mongo through the (installedAt, createdAt)
+    index; afterwards the write buffer offers each record once it is stored
+    and the cache only changes when that record sorts earlier, so reads
+    never touch Mongo. Records offered before the first load are merged in.
+    """
+
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+        self._first: Optional[dict] = None
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def offer(self, doc: dict) -> None:
+        if self._first is None or first_install_key(doc) < first_install_key(self._first):
+            self._first = dict(doc)
+
+    def offer_many(self, docs: List[dict]) -> None:
+        for doc in docs:
+            self.offer(doc)
+
+    async def get(self) -> Optional[dict]:
+        if not self._loaded:
+            async with self._load_lock:
+                if not self._loaded:
+                    docs = await self.get_collection().find().sort(FIRST_INSTALL_SORT).limit(1).to_list(length=1)
+                    if docs:
+                        self.offer(docs[0])
+                    self._loaded = True
+        return self._first
+
+class InstallWriteBuffer:
+    """
+    Write-behind buffer for install records.
+
+    Records are flushed with one insert_many once batch_size are queued or
+    every flush_interval seconds, whichever comes first. At most max_buffered
+    records are held. When the buffer is full, one caller waits for a flush;
+    while that flush runs, or after one failed, new records are rejected at
+    once rather than queueing behind an unreachable Mongo. The periodic flush
+    keeps retrying and lifts the rejection once a flush succeeds. Records
+    known to be stored are passed to on_written after each flush.
+    """
+
+    def __init__(self, get_collection, batch_size: int = 100, flush_interval: float = 1.0, max_buffered: int = 10000,
+                 on_written: Optional[Callable[[List[dict]], None]] = None):
+        self.get_collection = get_collection
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+
+        self._buffer: List[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._pending_flushes = set()
+        self._last_flush_failed = False
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    async def add(self, doc: dict) -> None:
+        if len(self._buffer) >= self.max_buffered:
+            if self._flush_lock.locked() or self._last_flush_failed:
+                raise HTTPException(status_code=503, detail="Analytics buffer full, retry later")
+            await self.flush()
+            if len(self._buffer) >= self.max_buffered:
+                raise HTTPException(status_code=503, detail="Analytics buffer full, retry later")
+
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.batch_size:
+            task = asyncio.get_running_loop().create_task(self.flush())
+            self._pending_flushes.add(task)
+            task.add_done_callback(self._pending_flushes.discard)
+
+    async def flush(self) -> int:
+        """
+        Write everything buffered so far and return how many records are now
+        stored. Rows the server reported as failed with a retryable code go
+        back to the front of the buffer, as does the whole batch on errors
+        where the outcome is unknown (e.g. a dropped connection). _ids are
+        assigned client-side, so a retried row that did get in comes back as
+        a duplicate key error and is treated as stored.
+        """
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            batch, self._buffer = self._buffer, []
+            try:
+                await self.get_collection().insert_many(batch, ordered=False)
+                written, retry = batch, []
+            except BulkWriteError as e:
+                failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+                # Rows without an error were inserted; duplicate keys were stored by an earlier attempt
+                written = [
+                    doc for i, doc in enumerate(batch)
+                    if i not in failed or failed[i].get("code") == DUPLICATE_KEY_ERROR
+                ]
+                retry = [batch[i] for i, error in failed.items() if error.get("code") in RETRYABLE_WRITE_ERRORS]
+                rejected = len(batch) - len(written) - len(retry)
+                if rejected:
+                    logger.error(f"Dropped {rejected} install records rejected by Mongo: {e.details.get('writeErrors', [])[:3]}")
+            except Exception as e:
+                logger.error(f"Install flush failed: {e}")
+                written, retry = [], batch
+
+            if retry:
+                keep = max(0, self.max_buffered - len(self._buffer))
+                self._buffer = retry[:keep] + self._buffer
+                if keep < len(retry):
+                    logger.error(f"Dropped {len(retry) - keep} install records after failed flush")
+            self._last_flush_failed = bool(retry)
+
+            if written and self.on_written is not None:
+                self.on_written(written)
+            return len(written)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._pending_flushes:
+            await asyncio.gather(*self._pending_flushes, return_exceptions=True)
+        await self.flush()
+
+first_install_cache = FirstInstallCache(get_installs_collection)
+
+install_buffer = InstallWriteBuffer(
+    get_installs_collection,
+    batch_size=INSTALL_BATCH_SIZE,
+    flush_interval=INSTALL_FLUSH_INTERVAL,
+    max_buffered=INSTALL_MAX_BUFFERED,
+    on_written=first_install_cache.offer_many,
+)
+
+async def startup_analytics():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not ensure analytics indexes: {e}")
+    install_buffer.start()
+
+async def shutdown_analytics():
+    global _client
+    await install_buffer.stop()
+    if _client is not None:
+        _client.close()
+        _client = None
+
+router.add_event_handler("startup", startup_analytics)
+router.add_event_handler("shutdown", shutdown_analytics)
 
 class InstallRecord(BaseModel):
     installedAt: Optional[datetime]
@@ -33,33 +247,28 @@ async def require_api_key(request: Request):
 
 @router.post("/install", status_code=201)
 async def record_install(payload: InstallRecord, request: Request, _=Depends(require_api_key)):
-    client = get_db_client()
-    db = client[DB_NAME]
-    coll = db["pwa_installs"]
     installed_at = payload.installedAt or datetime.utcnow()
     doc = {
-        "installedAt": installed_at,
+        "_id": ObjectId(),
+        "installedAt": to_mongo_datetime(installed_at),
         "userAgent": payload.userAgent,
         "platform": payload.platform,
         "clientId": payload.clientId,
         "extra": payload.extra or {},
-        "createdAt": datetime.utcnow()
+        "createdAt": to_mongo_datetime(datetime.utcnow())
     }
-    res = await coll.insert_one(doc)
-    return {"success": True, "id": str(res.inserted_id)}
+    await install_buffer.add(doc)
+    return {"success": True, "id": str(doc["_id"])}
 
 @router.get("/first-installed")
 async def get_first_installed(request: Request, _=Depends(require_api_key)):
-    client = get_db_client()
-    db = client[DB_NAME]
-    coll = db["pwa_installs"]
-    doc = await coll.find().sort([("installedAt", 1), ("createdAt", 1)]).limit(1).to_list(length=1)
-    if not doc:
+    cached = await first_install_cache.get()
+    if cached is None:
         return {"success": False, "message": "No installs found"}
-    first = doc[0]
+    first = dict(cached)
     first["id"] = str(first.get("_id"))
     first.pop("_id", None)
     for k in ("installedAt", "createdAt"):
         if first.get(k) and hasattr(first[k], "isoformat"):
             first[k] = first[k].isoformat()
-    return {"success": True, "firstInstalled": first}
\ No newline at end of file
+    return {"success": True, "firstInstalled": first}
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from pymongo.errors import ServerSelectionTimeoutError  # noqa: E402
+
+import analytics  # noqa: E402
+
+
+def make_install(installed_at: datetime) -> dict:
+    return {
+        "_id": ObjectId(),
+        "installedAt": analytics.to_mongo_datetime(installed_at),
+        "createdAt": analytics.to_mongo_datetime(datetime.utcnow()),
+        "clientId": "c",
+    }
+
+
+def make_store():
+    collection = AsyncMongoMockClient()["sports_central"]["pwa_installs"]
+    cache = analytics.FirstInstallCache(lambda: collection)
+    buffer = analytics.InstallWriteBuffer(lambda: collection, batch_size=1000, max_buffered=10,
+                                          on_written=cache.offer_many)
+    return collection, cache, buffer
+
+
+def test_ensure_indexes_covers_first_install_sort(monkeypatch):
+    collection, _, _ = make_store()
+    monkeypatch.setattr(analytics, "get_installs_collection", lambda: collection)
+
+    async def scenario():
+        await analytics.ensure_indexes()
+        await analytics.ensure_indexes()
+        return await collection.index_information()
+
+    indexes = asyncio.run(scenario())
+    assert indexes["installedAt_1_createdAt_1"]["key"] == analytics.FIRST_INSTALL_SORT
+
+
+def test_first_installed_matches_sorted_query():
+    async def scenario():
+        collection, cache, buffer = make_store()
+        base = datetime(2024, 1, 1)
+        for days in (5, 2, 9):
+            await buffer.add(make_install(base + timedelta(days=days)))
+
+        # Nothing is reported before the records are stored
+        assert await cache.get() is None
+        assert await buffer.flush() == 3
+
+        expected = await collection.find().sort(analytics.FIRST_INSTALL_SORT).limit(1).to_list(length=1)
+        assert (await cache.get())["_id"] == expected[0]["_id"]
+
+        await buffer.add(make_install(base))
+        await buffer.flush()
+        assert (await cache.get())["installedAt"] == base
+
+    asyncio.run(scenario())
+
+
+def test_cold_cache_loads_earliest_from_collection():
+    async def scenario():
+        collection, cache, _ = make_store()
+        base = datetime(2024, 1, 1)
+        docs = [make_install(base + timedelta(hours=h)) for h in (3, 1, 2)]
+        await collection.insert_many(docs)
+        assert (await cache.get())["_id"] == docs[1]["_id"]
+
+    asyncio.run(scenario())
+
+
+def test_flush_drains_rows_already_stored():
+    async def scenario():
+        collection, cache, buffer = make_store()
+        docs = [make_install(datetime(2024, 1, 1, h)) for h in range(5)]
+        await collection.insert_one(dict(docs[0]))
+        for doc in docs:
+            await buffer.add(doc)
+
+        assert await buffer.flush() == 5
+        assert len(buffer) == 0
+        assert await collection.count_documents({}) == 5
+        assert (await cache.get())["_id"] == docs[0]["_id"]
+
+    asyncio.run(scenario())
+
+
+class UnreachableCollection:
+    """Stands in for a collection whose server cannot be selected"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.release = asyncio.Event()
+
+    async def insert_many(self, docs, ordered=True):
+        self.attempts += 1
+        await self.release.wait()
+        raise ServerSelectionTimeoutError("no servers")
+
+
+def test_full_buffer_rejects_without_waiting_for_a_failing_flush():
+    async def scenario():
+        collection = UnreachableCollection()
+        buffer = analytics.InstallWriteBuffer(lambda: collection, batch_size=1000, max_buffered=2)
+        for hours in range(2):
+            await buffer.add(make_install(datetime(2024, 1, 1, hours)))
+
+        # The first caller to find the buffer full waits for the flush...
+        first = asyncio.create_task(buffer.add(make_install(datetime(2024, 1, 2))))
+        await asyncio.sleep(0)
+        for hours in range(2):
+            await buffer.add(make_install(datetime(2024, 1, 3, hours)))
+        # ...and once it has refilled, everyone else is turned away while that flush runs
+        with pytest.raises(analytics.HTTPException) as rejected:
+            await asyncio.wait_for(buffer.add(make_install(datetime(2024, 1, 4))), timeout=0.1)
+        assert rejected.value.status_code == 503
+
+        collection.release.set()
+        with pytest.raises(analytics.HTTPException):
+            await first
+        # After a failed flush, a full buffer rejects without trying Mongo again
+        with pytest.raises(analytics.HTTPException):
+            await buffer.add(make_install(datetime(2024, 1, 5)))
+        assert collection.attempts == 1
+        assert len(buffer) == 2
+
+    asyncio.run(scenario())
@@ -1,8 +1,14 @@
 # PyTorch ML model for match outcome prediction
+import logging
+from typing import Optional
+
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 
+logger = logging.getLogger(__name__)
+
 class MatchPredictor(nn.Module):
     def __init__(self, input_size: int, hidden_size: int = 32, output_size: int = 3):
         super(MatchPredictor, self).__init__()
@@ -23,6 +29,70 @@ def save_model(model, path="prediction_model.pth"):
 
 def load_model(input_size, path="prediction_model.pth"):
     model = MatchPredictor(input_size)
-    model.load_state_dict(torch.load(path))
+    model.load_state_dict(torch.load(path, map_location="cpu"))
     model.eval()
-    return model
\ No newline at end of file
+    return model
+
+def configure_threads(intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None):
+    """
+    Set torch's CPU thread pools. Both settings are process-wide, and the
+    inter-op pool can only be sized before torch first uses it, so a late
+    call is logged and ignored rather than failing the caller.
+    """
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            logger.warning(f"Inter-op threads already initialised, keeping {torch.get_num_interop_threads()}: {e}")
+
+class MatchPredictorServer:
+    """
+    CPU serving wrapper around MatchPredictor.
+
+    The model is loaded once and every call runs a batched forward pass under
+    torch.inference_mode. variant picks the executed graph: "eager" runs the
+    module as is, "torchscript" runs a traced and frozen TorchScript graph,
+    and "quantized" runs dynamically quantised int8 Linear layers.
+    """
+
+    VARIANTS = ("eager", "torchscript", "quantized")
+
+    def __init__(
+        self,
+        model: MatchPredictor,
+        variant: str = "eager",
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: Optional[int] = None,
+    ):
+        if variant not in self.VARIANTS:
+            raise ValueError(f"Unknown variant '{variant}', expected one of {self.VARIANTS}")
+
+        configure_threads(intra_op_threads, inter_op_threads)
+
+        self.variant = variant
+        self.input_size = model.fc1.in_features
+        model = model.eval()
+
+        if variant == "quantized":
+            model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        elif variant == "torchscript":
+            with torch.inference_mode():
+                traced = torch.jit.trace(model, torch.zeros(1, self.input_size))
+            model = torch.jit.freeze(traced.eval())
+
+        self.model = model
+
+    @classmethod
+    def from_path(cls, input_size: int, path: str = "prediction_model.pth", **kwargs) -> "MatchPredictorServer":
+        return cls(load_model(input_size, path), **kwargs)
+
+    def predict_proba(self, features) -> np.ndarray:
+        """Class probabilities for an (N, input_size) array-like, as an (N, 3) float32 array."""
+        inputs = torch.as_tensor(np.asarray(features, dtype=np.float32))
+        if inputs.ndim != 2 or inputs.shape[1] != self.input_size:
+            raise ValueError(f"Expected an (N, {self.input_size}) feature matrix, got shape {tuple(inputs.shape)}")
+
+        with torch.inference_mode():
+            return self.model(inputs).numpy()